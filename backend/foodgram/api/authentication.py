@@ -0,0 +1,201 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from api.telemetry import TOKEN_CACHE_REQUESTS
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+
+class TokenCache:
+    """
+    Cache of authenticated users by token key.
+
+    When TOKEN_CACHE setting names a cache shared between processes,
+    entries are kept only there, otherwise in a process-local LRU cache
+    of at most TOKEN_CACHE_SIZE entries. Entries live
+    for TOKEN_CACHE_TTL seconds.
+
+    Tokens are discarded one by one when deleted, and all tokens
+    of a user when the user is deactivated or changes password.
+    Every token has a generation, changed when it is discarded,
+    and entries are valid only at the generation read before
+    the database, so a discarded token is never accepted again
+    by any process sharing the cache. Local entries are discarded
+    in current process only and expire in others within
+    TOKEN_CACHE_TTL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generation = 0
+
+    def get(self, key):
+        """
+        Method for getting copies of cached user and token
+        with current generation of the token.
+
+        User and token are None on a miss, the generation
+        is then passed to set with the user read from the database.
+        """
+        if settings.TOKEN_CACHE:
+            entry, generation = self._get_shared(key)
+            result = "shared_hit"
+        else:
+            entry, generation = self._get_local(key), self._generation
+            result = "hit"
+        if entry is None:
+            TOKEN_CACHE_REQUESTS.inc(("miss",))
+            return None, generation
+        TOKEN_CACHE_REQUESTS.inc((result,))
+        user, token = copy.copy(entry[0]), copy.copy(entry[1])
+        token.user = user
+        return (user, token), generation
+
+    def set(self, key, user, token, generation):
+        """
+        Method for caching copies of user and token
+        read at given generation of the token.
+        """
+        user, token = copy.copy(user), copy.copy(token)
+        token.user = user
+        if settings.TOKEN_CACHE:
+            # Entry of a token discarded meanwhile never matches
+            # its new generation.
+            caches[settings.TOKEN_CACHE].set(
+                self.shared_key(key),
+                (user, token, generation),
+                settings.TOKEN_CACHE_TTL,
+            )
+            return
+        entry = (user, token, time.monotonic() + settings.TOKEN_CACHE_TTL)
+        with self._lock:
+            # User read before a discard in this process may be stale.
+            if generation != self._generation:
+                return
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        """
+        Method for removing a token from the cache.
+        """
+        self.discard_keys([key])
+
+    def discard_user(self, user_id):
+        """
+        Method for removing all tokens of a user from the cache.
+        """
+        with self._lock:
+            keys = [
+                key
+                for key, entry in self._entries.items()
+                if entry[0].pk == user_id
+            ]
+        if settings.TOKEN_CACHE:
+            keys.extend(
+                Token.objects.filter(user_id=user_id).values_list(
+                    "key", flat=True
+                )
+            )
+        self.discard_keys(keys)
+
+    def discard_keys(self, keys):
+        """
+        Method for removing tokens from the cache by keys.
+        """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+        if settings.TOKEN_CACHE and keys:
+            # Generations outlive entries cached before they change.
+            caches[settings.TOKEN_CACHE].set_many(
+                {
+                    self.generation_key(key): time.time_ns()
+                    for key in keys
+                },
+                2 * settings.TOKEN_CACHE_TTL,
+            )
+
+    def clear(self):
+        """
+        Method for removing all tokens of this process.
+        """
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def _get_shared(self, key):
+        entry_key, generation_key = (
+            self.shared_key(key),
+            self.generation_key(key),
+        )
+        values = caches[settings.TOKEN_CACHE].get_many(
+            [entry_key, generation_key]
+        )
+        entry, generation = values.get(entry_key), values.get(generation_key)
+        if entry is not None and entry[2] != generation:
+            entry = None
+        return entry, generation
+
+    @staticmethod
+    def shared_key(key):
+        return "token:" + hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def generation_key(cls, key):
+        return "generation:" + cls.shared_key(key)
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication reading users from the token cache.
+
+    Works as TokenAuthentication, but the database is queried
+    only on cache misses.
+    """
+
+    def authenticate_credentials(self, key):
+        # Generation is read before the database, so a discard made
+        # in between prevents caching the possibly stale user.
+        cached, generation = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        model = self.get_model()
+        try:
+            token = model.objects.select_related("user").get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_("Invalid token."))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+
+        token_cache.set(key, token.user, token, generation)
+        return (token.user, token)
@@ -0,0 +1,175 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from recipes.models import RecipeIngredient, RecipeIngredientsChange
+
+# Compact arrays of unsigned 64-bit ids.
+TYPECODE = "Q"
+
+
+class CookableIndex:
+    """
+    Process-local inverted index from ingredients to recipes.
+
+    Every ingredient has a sorted array of ids of recipes using it,
+    every recipe has a sorted array of its ingredient ids.
+    Recipes cookable from a set of ingredients are found by counting
+    hits over posting arrays of these ingredients only.
+
+    Index is loaded on first search and refreshed incrementally by
+    recipe serializers and signals. Changes are also recorded
+    in RecipeIngredientsChange, before every search other processes
+    reload ingredients of recipes changed since their last check.
+    Changes not made through the API, or committed out of order
+    of their ids, are picked up after COOKABLE_INDEX_TTL seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = {}
+        self._recipes = {}
+        self._change_id = 0
+        self._loaded_at = None
+
+    def load(self):
+        """
+        Method for loading all recipe ingredients from the database.
+        """
+        # Changes are read first, so ones committed during loading
+        # are applied again by the next sync.
+        change_id = self._last_change_id()
+        postings = {}
+        recipes = {}
+        rows = (
+            RecipeIngredient.objects.order_by("ingredient_id", "recipe_id")
+            .values_list("ingredient_id", "recipe_id")
+            .iterator()
+        )
+        for ingredient_id, recipe_id in rows:
+            postings.setdefault(ingredient_id, array(TYPECODE)).append(
+                recipe_id
+            )
+            recipes.setdefault(recipe_id, array(TYPECODE)).append(
+                ingredient_id
+            )
+        with self._lock:
+            self._postings = postings
+            self._recipes = recipes
+            self._change_id = change_id
+            self._loaded_at = time.monotonic()
+
+    def set_recipe(self, recipe_id, ingredient_ids):
+        """
+        Method for replacing ingredients of a recipe.
+
+        Empty ingredient_ids remove the recipe from the index.
+        """
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            old = set(self._recipes.pop(recipe_id, ()))
+            new = set(ingredient_ids)
+            for ingredient_id in old - new:
+                posting = self._postings[ingredient_id]
+                del posting[bisect_left(posting, recipe_id)]
+                if not posting:
+                    del self._postings[ingredient_id]
+            for ingredient_id in new - old:
+                insort(
+                    self._postings.setdefault(ingredient_id, array(TYPECODE)),
+                    recipe_id,
+                )
+            if new:
+                self._recipes[recipe_id] = array(TYPECODE, sorted(new))
+
+    def remove_recipe(self, recipe_id):
+        """
+        Method for removing a recipe.
+        """
+        self.set_recipe(recipe_id, ())
+
+    def record_changes(self, recipe_ids):
+        """
+        Method for recording changed ingredients of recipes
+        for other processes, in the transaction of the change.
+        """
+        RecipeIngredientsChange.objects.bulk_create(
+            RecipeIngredientsChange(recipe_id=recipe_id)
+            for recipe_id in recipe_ids
+        )
+        RecipeIngredientsChange.objects.filter(
+            changed_at__lt=timezone.now()
+            - timedelta(seconds=settings.COOKABLE_CHANGES_TTL)
+        ).delete()
+
+    def sync(self):
+        """
+        Method for reloading recipes changed since the last check.
+        """
+        changes = list(
+            RecipeIngredientsChange.objects.filter(
+                pk__gt=self._change_id
+            ).values_list("pk", "recipe_id")
+        )
+        if not changes:
+            return
+        ingredients = {recipe_id: [] for _, recipe_id in changes}
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=ingredients
+        ).values_list("recipe_id", "ingredient_id")
+        for recipe_id, ingredient_id in rows:
+            ingredients[recipe_id].append(ingredient_id)
+        for recipe_id, ingredient_ids in ingredients.items():
+            self.set_recipe(recipe_id, ingredient_ids)
+        with self._lock:
+            self._change_id = max(
+                self._change_id, max(pk for pk, _ in changes)
+            )
+
+    def search(self, ingredient_ids, max_missing=None):
+        """
+        Method for getting (recipe id, missing count) pairs of recipes
+        using given ingredients.
+
+        Full matches come first, then recipes missing one ingredient
+        and so on, newer recipes first within the same rank.
+        """
+        if self._is_stale():
+            self.load()
+        else:
+            self.sync()
+        hits = Counter()
+        ranked = []
+        with self._lock:
+            for ingredient_id in set(ingredient_ids):
+                hits.update(self._postings.get(ingredient_id, ()))
+            for recipe_id, count in hits.items():
+                missing = len(self._recipes[recipe_id]) - count
+                if max_missing is None or missing <= max_missing:
+                    ranked.append((missing, -recipe_id))
+        ranked.sort()
+        return [(-recipe_id, missing) for missing, recipe_id in ranked]
+
+    def _is_stale(self):
+        return (
+            self._loaded_at is None
+            or time.monotonic() - self._loaded_at
+            > settings.COOKABLE_INDEX_TTL
+        )
+
+    @staticmethod
+    def _last_change_id():
+        return (
+            RecipeIngredientsChange.objects.aggregate(last=Max("pk"))["last"]
+            or 0
+        )
+
+
+cookable_index = CookableIndex()
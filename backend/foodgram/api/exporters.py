@@ -0,0 +1,132 @@
+import csv
+import json
+
+
+class ShoppingListExporter:
+    """
+    Base exporter for shopping list.
+
+    Turns aggregated ingredient rows into a stream of text chunks,
+    one chunk per row, so the list is never built in memory.
+    """
+
+    extension = "txt"
+    content_type = "text/plain; charset=UTF-8"
+
+    def header(self):
+        return ""
+
+    def row(self, ingredient):
+        raise NotImplementedError
+
+    def footer(self):
+        return ""
+
+    def stream(self, ingredients):
+        """
+        Method for generating file chunks from ingredient rows.
+        """
+        yield self.header()
+        for ingredient in ingredients:
+            yield self.row(ingredient)
+        yield self.footer()
+
+
+class TextExporter(ShoppingListExporter):
+    """
+    Exporter for plain text shopping list.
+    """
+
+    def header(self):
+        return "   Shopping list:"
+
+    def row(self, ingredient):
+        return (
+            f'\n•  {ingredient["ingredient__name"]} '
+            f'({ingredient["ingredient__measurement_unit"]}) '
+            f'— {ingredient["amount"]}'
+        )
+
+
+class PrintExporter(ShoppingListExporter):
+    """
+    Exporter for compact printable checklist.
+    """
+
+    def row(self, ingredient):
+        return (
+            f'[ ] {ingredient["ingredient__name"]} '
+            f'{ingredient["amount"]} '
+            f'{ingredient["ingredient__measurement_unit"]}\n'
+        )
+
+
+class Echo:
+    """
+    Pseudo buffer that returns written value instead of storing it.
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVExporter(ShoppingListExporter):
+    """
+    Exporter for csv shopping list.
+    """
+
+    extension = "csv"
+    content_type = "text/csv; charset=UTF-8"
+
+    def __init__(self):
+        self.writer = csv.writer(Echo())
+
+    def header(self):
+        return self.writer.writerow(("name", "measurement_unit", "amount"))
+
+    def row(self, ingredient):
+        return self.writer.writerow(
+            (
+                ingredient["ingredient__name"],
+                ingredient["ingredient__measurement_unit"],
+                ingredient["amount"],
+            )
+        )
+
+
+class JSONExporter(ShoppingListExporter):
+    """
+    Exporter for json shopping list.
+    """
+
+    extension = "json"
+    content_type = "application/json"
+
+    def __init__(self):
+        self.separator = ""
+
+    def header(self):
+        return "["
+
+    def row(self, ingredient):
+        chunk = self.separator + json.dumps(
+            {
+                "name": ingredient["ingredient__name"],
+                "measurement_unit": ingredient["ingredient__measurement_unit"],
+                "amount": ingredient["amount"],
+            },
+            ensure_ascii=False,
+        )
+        self.separator = ","
+        return chunk
+
+    def footer(self):
+        return "]"
+
+
+SHOPPING_LIST_EXPORTERS = {
+    "txt": TextExporter,
+    "print": PrintExporter,
+    "csv": CSVExporter,
+    "json": JSONExporter,
+}
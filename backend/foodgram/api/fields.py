@@ -1,19 +1,96 @@
 import base64
 
+from api.uploads import UPLOAD_PREFIX, get_upload
+from django.conf import settings
 from django.core.files.base import ContentFile
-from rest_framework.serializers import ImageField
+from PIL import Image
+from recipes.variants import variant_names
+from rest_framework.serializers import Field, ImageField
 
 
 class Base64ImageField(ImageField):
     """
     Serializer for recipes image.
+
+    Accepts base64 data URI, multipart file
+    or token of chunked upload prefixed with "upload:".
+
+    Size and pixel limits are checked before image is fully decoded.
+    Opened chunked upload is kept in upload attribute
+    for the serializer to close or remove it.
     """
 
+    upload = None
+
+    default_error_messages = {
+        **ImageField.default_error_messages,
+        "too_large": "Image must be smaller than {max_size} bytes.",
+        "too_many_pixels": "Image must have at most {max_pixels} pixels.",
+        "invalid_upload": "Upload not found or not completed.",
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
             format, imgstr = data.split(";base64,")
             ext = format.split("/")[-1]
+            if len(imgstr) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                self.fail(
+                    "too_large", max_size=settings.RECIPE_IMAGE_MAX_SIZE
+                )
 
             data = ContentFile(base64.b64decode(imgstr), name="temp." + ext)
+        elif isinstance(data, str) and data.startswith(UPLOAD_PREFIX):
+            data = get_upload(
+                self.context["request"].user, data[len(UPLOAD_PREFIX):]
+            )
+            if data is None:
+                self.fail("invalid_upload")
+            self.upload = data
 
+        if hasattr(data, "read"):
+            self.check_limits(data)
         return super().to_internal_value(data)
+
+    def check_limits(self, data):
+        """
+        Method for checking image size and pixels from its header.
+        """
+        if data.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail("too_large", max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        try:
+            with Image.open(data) as image:
+                width, height = image.size
+        except Exception:
+            # Invalid images are reported by ImageField validation.
+            return
+        finally:
+            data.seek(0)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail(
+                "too_many_pixels", max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS
+            )
+
+
+class ImageVariantsField(Field):
+    """
+    Read-only serializer of URLs of resized image variants.
+
+    Variants are generated when image is saved,
+    missing image is represented as None.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get("request")
+        urls = {}
+        for variant, name in variant_names(value.name).items():
+            url = value.storage.url(name)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant] = url
+        return urls
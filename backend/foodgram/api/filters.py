@@ -1,3 +1,4 @@
+from api.ingredient_index import ingredient_index
 from django_filters.rest_framework import FilterSet, filters
 from recipes.models import Recipe, Tag
 from rest_framework.filters import SearchFilter
@@ -17,6 +18,7 @@ class RecipeFilter(FilterSet):
         queryset=Tag.objects.all(),
     )
     author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    search = filters.CharFilter(method="get_search")
 
     class Meta:
         model = Recipe
@@ -25,20 +27,43 @@ class RecipeFilter(FilterSet):
             "is_in_shopping_cart",
             "author",
             "tags",
+            "search",
         )
 
     def get_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(favorite__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
 
+    def get_search(self, queryset, name, value):
+        """
+        Method for full-text search in recipe names and texts.
+
+        Matching recipes are ordered by rank, except for cursor
+        pagination which keeps publication date order.
+        """
+        return queryset.search(value)
+
 
 class IngredientFilter(SearchFilter):
+    """
+    Filter for ingredients autocomplete.
+
+    Listing is answered from in-memory prefix index,
+    other actions fall back to database search.
+    """
+
     search_param = "name"
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, "")
+        if view.action != "list" or not term.strip():
+            return super().filter_queryset(request, queryset, view)
+        return ingredient_index.search(term)
@@ -0,0 +1,162 @@
+from api.loaders import SubscriptionLoader
+from api.telemetry import timed_representation
+from django.conf import settings
+from django.core.cache import caches
+from recipes.models import Recipe, RecipeIngredient
+from recipes.variants import variant_names
+from users.models import User
+
+TAG_FIELDS = ("id", "name", "color", "slug")
+INGREDIENT_FIELDS = ("id", "name", "measurement_unit", "amount")
+AUTHOR_FIELDS = ("id", "email", "username", "first_name", "last_name")
+# Increased when fragments change shape, so old ones are not read.
+FRAGMENT_FORMAT = 2
+
+
+def fragment_key(recipe):
+    """
+    Get cache key of recipe fragment.
+
+    Key changes with fragment format and with recipe version,
+    increased in the database on edits of recipe, its author,
+    its tags and its ingredients.
+    """
+    return f"recipe:{FRAGMENT_FORMAT}:{recipe.pk}:{recipe.version}"
+
+
+def variant_urls(storage, image):
+    """
+    Get relative URLs of image variants by variant.
+    """
+    if not image:
+        return None
+    return {
+        variant: storage.url(name)
+        for variant, name in variant_names(image).items()
+    }
+
+
+def build_fragments(recipe_ids):
+    """
+    Build shared representations of recipes from projected columns.
+
+    Recipes, their tags, ingredients and authors are fetched with one
+    values query each and assembled into plain dicts with the same
+    keys, order and values as RecipeSerializer gives, without building
+    serializer fields for every nested object.
+    """
+    recipes = list(
+        Recipe.objects.filter(pk__in=recipe_ids).values_list(
+            "id", "name", "image", "text", "cooking_time", "author_id"
+        )
+    )
+    tags = {}
+    for recipe_id, *tag in (
+        Recipe.tags.through.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("tag__slug")
+        .values_list(
+            "recipe_id", "tag__id", "tag__name", "tag__color", "tag__slug"
+        )
+    ):
+        tags.setdefault(recipe_id, []).append(dict(zip(TAG_FIELDS, tag)))
+    ingredients = {}
+    for recipe_id, *ingredient in (
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids)
+        .order_by("pk")
+        .values_list(
+            "recipe_id",
+            "id",
+            "ingredient__name",
+            "ingredient__measurement_unit",
+            "amount",
+        )
+    ):
+        ingredients.setdefault(recipe_id, []).append(
+            dict(zip(INGREDIENT_FIELDS, ingredient))
+        )
+    authors = {
+        author["id"]: author
+        for author in User.objects.filter(
+            pk__in={recipe[-1] for recipe in recipes}
+        ).values(*AUTHOR_FIELDS)
+    }
+    storage = Recipe._meta.get_field("image").storage
+    return {
+        pk: {
+            "id": pk,
+            "tags": tags.get(pk, []),
+            "author": {**authors[author_id], "is_subscribed": False},
+            "ingredients": ingredients.get(pk, []),
+            "name": name,
+            "image": storage.url(image) if image else None,
+            "image_variants": variant_urls(storage, image),
+            "text": text,
+            "cooking_time": cooking_time,
+        }
+        for pk, name, image, text, cooking_time, author_id in recipes
+    }
+
+
+def get_fragments(recipes):
+    """
+    Get shared representations of recipes, building missing ones.
+
+    Cached fragments are fetched in one multi-get, missing ones
+    are built together and stored in one multi-set.
+    Recipes deleted meanwhile get None.
+    """
+    cache = caches[settings.RECIPE_FRAGMENT_CACHE]
+    keys = [fragment_key(recipe) for recipe in recipes]
+    fragments = cache.get_many(keys)
+    missing = {
+        recipe.pk: key
+        for key, recipe in zip(keys, recipes)
+        if key not in fragments
+    }
+    if missing:
+        created = {
+            missing[pk]: fragment
+            for pk, fragment in build_fragments(list(missing)).items()
+        }
+        cache.set_many(created)
+        fragments.update(created)
+    return [fragments.get(key) for key in keys]
+
+
+def represent_recipes(recipes, request):
+    """
+    Represent recipes annotated with user flags for request.
+
+    Shared fragments are completed with flags of current user
+    and absolute image URLs, the output equals RecipeSerializer one.
+    Recipes need only id, version and the flags loaded.
+    Time is recorded as serializer time of the request.
+    """
+    with timed_representation():
+        return complete_fragments(recipes, request)
+
+
+def complete_fragments(recipes, request):
+    """
+    Complete shared fragments of recipes for request.
+    """
+    author_ids = SubscriptionLoader.for_request(request).author_ids
+    representations = []
+    for recipe, fragment in zip(recipes, get_fragments(recipes)):
+        if fragment is None:
+            continue
+        data = dict(fragment)
+        data["author"] = {
+            **fragment["author"],
+            "is_subscribed": fragment["author"]["id"] in author_ids,
+        }
+        if data["image"]:
+            data["image"] = request.build_absolute_uri(data["image"])
+            data["image_variants"] = {
+                variant: request.build_absolute_uri(url)
+                for variant, url in data["image_variants"].items()
+            }
+        data["is_favorited"] = recipe.is_favorited
+        data["is_in_shopping_cart"] = recipe.is_in_shopping_cart
+        representations.append(data)
+    return representations
@@ -0,0 +1,159 @@
+import copy
+import re
+import threading
+from bisect import bisect_left, insort
+
+from api.versions import CATALOGUE, get_version
+from recipes.models import Ingredient
+
+WORD = re.compile(r"\w+")
+
+
+class IngredientIndex:
+    """
+    Process-local prefix index of ingredient names.
+
+    Answers autocomplete searches case-insensitively without touching
+    the database. Results are ranked: exact matches, then name prefix
+    matches, then matches at the start of any other word of the name.
+
+    Index is loaded on first search and kept up to date by Ingredient
+    signals once their transaction commits. It remembers the catalogue
+    version it was loaded at and is reloaded when the version changes,
+    so results cached under a catalogue version never come
+    from an index older than it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ingredients = {}
+        self._names = []
+        self._words = []
+        self._version = None
+
+    def load(self, version):
+        """
+        Method for loading all ingredients at given catalogue version.
+        """
+        ingredients = {
+            ingredient.pk: ingredient
+            for ingredient in Ingredient.objects.all()
+        }
+        names = []
+        words = []
+        for ingredient in ingredients.values():
+            name, ingredient_words = self._entries(ingredient)
+            names.append(name)
+            words.extend(ingredient_words)
+        names.sort()
+        words.sort()
+        with self._lock:
+            self._ingredients = ingredients
+            self._names = names
+            self._words = words
+            self._version = version
+
+    def add(self, ingredient):
+        """
+        Method for adding or updating an ingredient.
+        """
+        with self._lock:
+            if self._version is None:
+                return
+            ingredients, names, words = self._copy()
+            old = ingredients.get(ingredient.pk)
+            if old is not None:
+                self._delete(names, words, old)
+            # Copy keeps the indexed name if the instance changes later.
+            ingredient = copy.copy(ingredient)
+            ingredients[ingredient.pk] = ingredient
+            name, ingredient_words = self._entries(ingredient)
+            insort(names, name)
+            for word in ingredient_words:
+                insort(words, word)
+            self._ingredients, self._names, self._words = (
+                ingredients,
+                names,
+                words,
+            )
+
+    def remove(self, pk):
+        """
+        Method for removing an ingredient.
+        """
+        with self._lock:
+            if pk not in self._ingredients:
+                return
+            ingredients, names, words = self._copy()
+            self._delete(names, words, ingredients.pop(pk))
+            self._ingredients, self._names, self._words = (
+                ingredients,
+                names,
+                words,
+            )
+
+    def search(self, term):
+        """
+        Method for getting ranked ingredients matching search term.
+        """
+        # Version is read before the database, so a change committed
+        # during loading leaves the index stale instead of hidden.
+        version = get_version(CATALOGUE)
+        if version != self._version:
+            self.load(version)
+        term = term.strip().lower()
+        # Changes replace the structures instead of modifying them,
+        # so a snapshot taken under the lock stays consistent.
+        with self._lock:
+            ingredients, names, words = (
+                self._ingredients,
+                self._names,
+                self._words,
+            )
+        exact, prefix = [], []
+        for name, pk in self._scan(names, term):
+            (exact if name == term else prefix).append(pk)
+        found = set(exact) | set(prefix)
+        word_start = sorted(
+            {pk for _, pk in self._scan(words, term)} - found,
+            key=lambda pk: ingredients[pk].name.lower(),
+        )
+        return [ingredients[pk] for pk in exact + prefix + word_start]
+
+    def _copy(self):
+        return dict(self._ingredients), list(self._names), list(self._words)
+
+    @staticmethod
+    def _entries(ingredient):
+        name = ingredient.name.lower()
+        words = [
+            (name[word.start():], ingredient.pk)
+            for word in WORD.finditer(name)
+            if word.start()
+        ]
+        return (name, ingredient.pk), words
+
+    @classmethod
+    def _delete(cls, names, words, ingredient):
+        name, ingredient_words = cls._entries(ingredient)
+        cls._discard(names, name)
+        for word in ingredient_words:
+            cls._discard(words, word)
+
+    @staticmethod
+    def _discard(entries, entry):
+        position = bisect_left(entries, entry)
+        if position < len(entries) and entries[position] == entry:
+            del entries[position]
+
+    @staticmethod
+    def _scan(entries, term):
+        position = bisect_left(entries, (term,))
+        while position < len(entries) and entries[position][0].startswith(
+            term
+        ):
+            yield entries[position]
+            position += 1
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,50 @@
+from users.models import Subscription
+
+
+class SubscriptionLoader:
+    """
+    Request-scoped loader of authors followed by current user.
+
+    Followed authors ids are fetched in one query on first use,
+    the rest of the request answers is_subscribed from memory.
+    """
+
+    request_attr = "_subscription_loader"
+
+    def __init__(self, user):
+        self.user = user
+        self._author_ids = None
+
+    @classmethod
+    def for_request(cls, request):
+        """
+        Method for getting loader shared by all serializers of request.
+        """
+        http_request = getattr(request, "_request", request)
+        loader = getattr(http_request, cls.request_attr, None)
+        if loader is None:
+            loader = cls(request.user)
+            setattr(http_request, cls.request_attr, loader)
+        return loader
+
+    @property
+    def author_ids(self):
+        """
+        Ids of authors followed by user, loaded once.
+        """
+        if self._author_ids is None:
+            if self.user.is_authenticated:
+                self._author_ids = set(
+                    Subscription.objects.filter(user=self.user).values_list(
+                        "author_id", flat=True
+                    )
+                )
+            else:
+                self._author_ids = set()
+        return self._author_ids
+
+    def is_subscribed(self, author):
+        """
+        Method for checking if user is subscribed to given author.
+        """
+        return author.pk in self.author_ids
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class DisposableDatabaseCommand(BaseCommand):
+    """
+    Command filling or altering the configured database for benchmarks.
+
+    Runs only in DEBUG mode or with --yes-i-know,
+    so a production database is never seeded by mistake.
+    """
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        parser = super().create_parser(prog_name, subcommand, **kwargs)
+        parser.add_argument(
+            "--yes-i-know",
+            action="store_true",
+            help="Confirm that the configured database is disposable.",
+        )
+        return parser
+
+    def execute(self, *args, **options):
+        if not settings.DEBUG and not options.get("yes_i_know"):
+            raise CommandError(
+                "This command changes the configured database. "
+                "Run it in DEBUG mode or pass --yes-i-know "
+                "if the database is disposable."
+            )
+        return super().execute(*args, **options)
@@ -0,0 +1,512 @@
+import json
+import math
+import statistics
+import time
+from datetime import datetime, timezone
+
+from api.management.base import DisposableDatabaseCommand
+from api.urls import router
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from recipes.models import Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.settings import api_settings
+from users.models import User
+
+# 1x1 transparent GIF.
+IMAGE = (
+    "data:image/gif;base64,"
+    "R0lGODlhAQABAIAAAAAAAP///yH5BAEAAAAALAAAAAABAAEAAAIBRAA7"
+)
+UPLOAD = b"0" * 1024
+# Recipes of a week plan added in bulk.
+WEEK_RECIPES = 21
+# Deepest page of recipes list requested, if there are that many.
+DEEP_PAGE = 50
+# Djoser account flows send emails or change credentials.
+SKIPPED = {
+    "subscriptions-activation",
+    "subscriptions-resend-activation",
+    "subscriptions-reset-password",
+    "subscriptions-reset-password-confirm",
+    "subscriptions-reset-username",
+    "subscriptions-reset-username-confirm",
+    "subscriptions-set-password",
+    "subscriptions-set-username",
+}
+
+
+class Step:
+    """
+    Single measured request of a scenario.
+
+    Path may be callable getting the scenario state,
+    state is updated with JSON of the response by keep.
+    """
+
+    def __init__(
+        self,
+        name,
+        url_name,
+        method="get",
+        path=None,
+        query="",
+        auth=True,
+        data=None,
+        keep=None,
+        **extra,
+    ):
+        self.name = name
+        self.url_name = url_name
+        self.method = method
+        self.path = path
+        self.query = query
+        self.auth = auth
+        self.data = data
+        self.keep = keep
+        self.extra = extra
+
+
+class Command(DisposableDatabaseCommand):
+    help = (
+        "Measures latency percentiles and SQL query counts "
+        "of every API router endpoint in-process "
+        "and saves results as JSON. "
+        "Write endpoints are measured in pairs restoring the data. "
+        "Run it against a disposable database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--skip-seed",
+            action="store_true",
+            help="Reuse data already in the database.",
+        )
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Path to JSON results, timestamped file by default.",
+        )
+        parser.add_argument(
+            "--compare",
+            default=None,
+            help="Path to JSON results of previous run to compare with.",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("Repeat must be positive.")
+        if not options["skip_seed"]:
+            call_command(
+                "seed_data",
+                users=options["users"],
+                recipes=options["recipes"],
+                random_seed=0,
+                stdout=self.stdout,
+                yes_i_know=True,
+            )
+        self.prepare()
+        scenarios = self.scenarios()
+        self.check_coverage(scenarios)
+
+        samples = {}
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            for _ in range(options["warmup"]):
+                for steps in scenarios:
+                    list(self.run_scenario(steps))
+            for _ in range(options["repeat"]):
+                for steps in scenarios:
+                    for step, timing, queries in self.run_scenario(steps):
+                        samples.setdefault(step, []).append((timing, queries))
+
+        results = {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "database": connection.vendor,
+            "repeat": options["repeat"],
+            "dataset": {
+                "users": User.objects.count(),
+                "recipes": Recipe.objects.count(),
+                "ingredients": Ingredient.objects.count(),
+            },
+            "endpoints": {
+                step.name: self.summarize(step, measures)
+                for step, measures in samples.items()
+            },
+        }
+        output = options["output"] or (
+            "benchmark-endpoints-"
+            f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+
+        previous = {}
+        if options["compare"]:
+            with open(options["compare"], "r", encoding="utf-8") as file:
+                previous = json.load(file)["endpoints"]
+        self.report(results["endpoints"], previous)
+        self.stdout.write(self.style.SUCCESS(f"Results saved to {output}."))
+
+    def prepare(self):
+        """
+        Method for choosing objects requested by scenarios.
+
+        Viewer is the most active user, other objects are chosen
+        so that write pairs start from a clean state.
+        """
+        self.viewer = (
+            User.objects.annotate(count=Count("favorite"))
+            .order_by("-count", "id")
+            .first()
+        )
+        if self.viewer is None or not Recipe.objects.exists():
+            raise CommandError("Database has no users or recipes.")
+        self.token = Token.objects.get_or_create(user=self.viewer)[0].key
+        recipes = list(
+            Recipe.objects.exclude(author=self.viewer)
+            .exclude(favorite__user=self.viewer)
+            .exclude(shopping_cart__user=self.viewer)
+            .order_by("-favorites_count")
+            .values_list("pk", flat=True)[: WEEK_RECIPES + 1]
+        )
+        self.recipe = Recipe.objects.filter(pk__in=recipes[:1]).first()
+        self.week = recipes[1:]
+        self.author = (
+            User.objects.exclude(pk=self.viewer.pk)
+            .exclude(author__user=self.viewer)
+            .order_by("-recipes_count")
+            .first()
+        )
+        if self.recipe is None or self.author is None:
+            raise CommandError(
+                "Database has no recipe or author the viewer can add."
+            )
+        self.tag = Tag.objects.first()
+        self.ingredients = list(
+            Recipe.objects.filter(pk=self.recipe.pk).values_list(
+                "ingredients", flat=True
+            )
+        )
+        self.ingredient = Ingredient.objects.get(pk=self.ingredients[0])
+        self.client = Client()
+
+    def scenarios(self):
+        """
+        Method for getting scenarios, lists of steps run in order.
+        """
+        recipe, author, tag = self.recipe.pk, self.author.pk, self.tag
+        ingredients = ",".join(map(str, self.ingredients))
+        last_page = max(
+            1, math.ceil(Recipe.objects.count() / api_settings.PAGE_SIZE)
+        )
+        deep_page = min(DEEP_PAGE, last_page)
+        recipe_data = {
+            "name": "Benchmark recipe",
+            "text": "Benchmark recipe text.",
+            "cooking_time": 10,
+            "tags": [tag.pk],
+            "image": IMAGE,
+            "ingredients": [
+                {"id": ingredient, "amount": 10}
+                for ingredient in self.ingredients
+            ],
+        }
+        return [
+            [Step("api root", "api-root")],
+            [Step("tags list", "tags-list", auth=False)],
+            [Step("tags detail", "tags-detail", path=[tag.pk], auth=False)],
+            [
+                Step(
+                    "ingredients search",
+                    "ingredients-list",
+                    query=f"name={self.ingredient.name[:3]}",
+                    auth=False,
+                )
+            ],
+            [
+                Step(
+                    "ingredients detail",
+                    "ingredients-detail",
+                    path=[self.ingredient.pk],
+                    auth=False,
+                )
+            ],
+            [Step("recipes list anonymous", "recipes-list", auth=False)],
+            [Step("recipes list", "recipes-list")],
+            [
+                Step(
+                    "recipes list deep page",
+                    "recipes-list",
+                    query=f"page={deep_page}",
+                )
+            ],
+            [
+                Step(
+                    "recipes list cursor",
+                    "recipes-list",
+                    query="pagination=cursor",
+                )
+            ],
+            [
+                Step(
+                    "recipes favorited",
+                    "recipes-list",
+                    query="is_favorited=1",
+                )
+            ],
+            [
+                Step(
+                    "recipes by tag and author",
+                    "recipes-list",
+                    query=f"tags={tag.slug}&author={author}",
+                )
+            ],
+            [Step("recipes search", "recipes-list", query="search=recipe")],
+            [Step("recipes detail", "recipes-detail", path=[recipe])],
+            [
+                Step(
+                    "recipes cookable",
+                    "recipes-cookable",
+                    query=f"ingredients={ingredients}",
+                )
+            ],
+            [Step("recipes feed", "recipes-feed")],
+            [
+                Step(
+                    "shopping list",
+                    "recipes-download-shopping-cart",
+                    query="format=json",
+                )
+            ],
+            [
+                Step(
+                    "recipe create",
+                    "recipes-list",
+                    method="post",
+                    data=recipe_data,
+                    keep=True,
+                ),
+                Step(
+                    "recipe update",
+                    "recipes-detail",
+                    method="patch",
+                    path=self.created_recipe,
+                    data=recipe_data,
+                ),
+                Step(
+                    "recipe delete",
+                    "recipes-detail",
+                    method="delete",
+                    path=self.created_recipe,
+                ),
+            ],
+            [
+                Step(
+                    "favorite add",
+                    "recipes-post-delete-favorite",
+                    method="post",
+                    path=[recipe],
+                ),
+                Step(
+                    "favorite remove",
+                    "recipes-post-delete-favorite",
+                    method="delete",
+                    path=[recipe],
+                ),
+            ],
+            [
+                Step(
+                    "shopping cart add",
+                    "recipes-post-delete-shopping-cart",
+                    method="post",
+                    path=[recipe],
+                ),
+                Step(
+                    "shopping cart remove",
+                    "recipes-post-delete-shopping-cart",
+                    method="delete",
+                    path=[recipe],
+                ),
+            ],
+            [
+                Step(
+                    "favorites bulk add",
+                    "recipes-post-delete-favorites",
+                    method="post",
+                    data={"recipes": self.week},
+                ),
+                Step(
+                    "favorites bulk remove",
+                    "recipes-post-delete-favorites",
+                    method="delete",
+                    data={"recipes": self.week},
+                ),
+            ],
+            [
+                Step(
+                    "shopping cart bulk add",
+                    "recipes-post-delete-shopping-carts",
+                    method="post",
+                    data={"recipes": self.week},
+                ),
+                Step(
+                    "shopping cart bulk remove",
+                    "recipes-post-delete-shopping-carts",
+                    method="delete",
+                    data={"recipes": self.week},
+                ),
+            ],
+            [Step("users list", "subscriptions-list")],
+            [Step("users detail", "subscriptions-detail", path=[author])],
+            [Step("users me", "subscriptions-me")],
+            [
+                Step(
+                    "subscriptions",
+                    "subscriptions-get-subscriptions",
+                    query="recipes_limit=3",
+                )
+            ],
+            [
+                Step(
+                    "subscribe",
+                    "subscriptions-post-delete-subscription",
+                    method="post",
+                    path=[author],
+                ),
+                Step(
+                    "unsubscribe",
+                    "subscriptions-post-delete-subscription",
+                    method="delete",
+                    path=[author],
+                ),
+            ],
+            [
+                Step(
+                    "upload start",
+                    "uploads-list",
+                    method="post",
+                    data={"size": len(UPLOAD)},
+                    keep=True,
+                ),
+                Step(
+                    "upload chunk",
+                    "uploads-detail",
+                    method="patch",
+                    path=self.started_upload,
+                    data=UPLOAD,
+                    content_type="application/offset+octet-stream",
+                    HTTP_UPLOAD_OFFSET="0",
+                ),
+                Step(
+                    "upload offset",
+                    "uploads-detail",
+                    path=self.started_upload,
+                ),
+            ],
+        ]
+
+    @staticmethod
+    def created_recipe(state):
+        return reverse("recipes-detail", args=[state["id"]])
+
+    @staticmethod
+    def started_upload(state):
+        return reverse("uploads-detail", args=[state["token"]])
+
+    def check_coverage(self, scenarios):
+        """
+        Method for warning about router endpoints without scenarios.
+        """
+        covered = {step.url_name for steps in scenarios for step in steps}
+        names = {pattern.name for pattern in router.urls if pattern.name}
+        missing = sorted(names - covered - SKIPPED)
+        if missing:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Endpoints without scenarios: {', '.join(missing)}."
+                )
+            )
+
+    def run_scenario(self, steps):
+        """
+        Method for running steps of a scenario,
+        yields steps with latency in ms and number of queries.
+        """
+        state = {}
+        for step in steps:
+            if callable(step.path):
+                path = step.path(state)
+            else:
+                path = reverse(step.url_name, args=step.path)
+            if step.query:
+                path = f"{path}?{step.query}"
+            kwargs = dict(step.extra)
+            if step.auth:
+                kwargs["HTTP_AUTHORIZATION"] = f"Token {self.token}"
+            if isinstance(step.data, bytes):
+                kwargs["data"] = step.data
+            elif step.data is not None:
+                kwargs["data"] = json.dumps(step.data)
+                kwargs["content_type"] = "application/json"
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = getattr(self.client, step.method)(path, **kwargs)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                timing = (time.perf_counter() - start) * 1000
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{step.name}: {step.method.upper()} {path} "
+                    f"returned {response.status_code}."
+                )
+            if step.keep:
+                state.update(response.json())
+            yield step, timing, len(queries)
+
+    def summarize(self, step, measures):
+        timings = [timing for timing, _ in measures]
+        queries = [count for _, count in measures]
+        if len(timings) > 1:
+            percentiles = statistics.quantiles(
+                timings, n=100, method="inclusive"
+            )
+        else:
+            percentiles = timings * 99
+        return {
+            "method": step.method.upper(),
+            "url_name": step.url_name,
+            "query": step.query,
+            "p50": round(percentiles[49], 3),
+            "p95": round(percentiles[94], 3),
+            "p99": round(percentiles[98], 3),
+            "mean": round(statistics.mean(timings), 3),
+            "queries": max(queries),
+        }
+
+    def report(self, endpoints, previous):
+        self.stdout.write(
+            f"\n{'endpoint':<28} {'p50':>9} {'p95':>9} {'p99':>9} "
+            f"{'queries':>8}"
+        )
+        for name, result in endpoints.items():
+            line = (
+                f"{name:<28} {result['p50']:>9.3f} {result['p95']:>9.3f} "
+                f"{result['p99']:>9.3f} {result['queries']:>8}"
+            )
+            before = previous.get(name)
+            if before:
+                change = (result["p50"] - before["p50"]) / before["p50"] * 100
+                line += (
+                    f"   p50 {change:+.1f}%, "
+                    f"queries {before['queries']} -> {result['queries']}"
+                )
+            self.stdout.write(line)
@@ -0,0 +1,146 @@
+import json
+import time
+from io import BytesIO
+from urllib.parse import unquote, urlparse
+
+from api.management.base import DisposableDatabaseCommand
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from PIL import Image
+from recipes.models import FeedEntry, Recipe
+from recipes.variants import VARIANTS
+from rest_framework.authtoken.models import Token
+
+
+class Command(DisposableDatabaseCommand):
+    help = (
+        "Gives photos to recipes of a feed page and compares bytes "
+        "of the page with original images and with image variants. "
+        "Run it against a disposable database and media root."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=20000)
+        parser.add_argument("--limit", type=int, default=6)
+        parser.add_argument("--width", type=int, default=3000)
+        parser.add_argument("--height", type=int, default=2000)
+        parser.add_argument("--quality", type=int, default=90)
+        parser.add_argument(
+            "--skip-seed",
+            action="store_true",
+            help="Reuse data already in the database.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["skip_seed"]:
+            call_command(
+                "seed_data",
+                users=options["users"],
+                recipes=options["recipes"],
+                stdout=self.stdout,
+                yes_i_know=True,
+            )
+        viewer = (
+            FeedEntry.objects.values("user")
+            .annotate(count=Count("pk"))
+            .order_by("-count")
+            .values_list("user", flat=True)
+            .first()
+        )
+        if viewer is None:
+            raise CommandError("Database has no feeds.")
+        token = Token.objects.get_or_create(user_id=viewer)[0].key
+
+        recipes = Recipe.objects.filter(
+            pk__in=FeedEntry.objects.filter(user=viewer)
+            .order_by("-pub_date", "-recipe_id")
+            .values("recipe")[: options["limit"]]
+        )
+        timings = []
+        for recipe in recipes:
+            if recipe.image:
+                continue
+            photo = self.make_photo(
+                options["width"], options["height"], options["quality"]
+            )
+            start = time.perf_counter()
+            recipe.image.save("photo.jpg", ContentFile(photo))
+            timings.append((time.perf_counter() - start) * 1000)
+        if timings:
+            self.stdout.write(
+                f"Saved {len(timings)} photos with variants, "
+                f"{sum(timings) / len(timings):.1f} ms per photo."
+            )
+
+        with override_settings(ALLOWED_HOSTS=["*"]):
+            response = Client().get(
+                reverse("recipes-feed"),
+                {"limit": options["limit"]},
+                HTTP_AUTHORIZATION=f"Token {token}",
+            )
+        if response.status_code != 200:
+            raise CommandError(f"Feed responded {response.status_code}.")
+        results = json.loads(response.content)["results"]
+        page = len(response.content)
+        images = {
+            "original": [recipe["image"] for recipe in results],
+            **{
+                variant: [
+                    (recipe["image_variants"] or {}).get(variant)
+                    for recipe in results
+                ]
+                for variant, _ in VARIANTS
+            },
+        }
+
+        self.stdout.write(
+            f"\nFeed page of {len(results)} recipes, JSON {page} bytes"
+        )
+        totals = {}
+        for name, urls in images.items():
+            totals[name] = page + sum(self.size(url) for url in urls)
+            self.stdout.write(
+                f"{name:<10} images {totals[name] - page:>10} bytes, "
+                f"page total {totals[name]:>10} bytes"
+            )
+        self.stdout.write(
+            f"\nBytes per feed page with card images: "
+            f"{totals['original']} -> {totals['card']} "
+            f"({totals['card'] / totals['original'] - 1:+.1%})"
+        )
+
+    @staticmethod
+    def make_photo(width, height, quality):
+        """
+        Method for making a noisy JPEG close to a camera photo in size.
+        """
+        noise = Image.effect_noise((width, height), 48)
+        gradient = Image.linear_gradient("L").resize((width, height))
+        photo = Image.merge(
+            "RGB",
+            (
+                Image.blend(gradient, noise, 0.5),
+                noise,
+                gradient.transpose(Image.FLIP_TOP_BOTTOM),
+            ),
+        )
+        buffer = BytesIO()
+        photo.save(buffer, "JPEG", quality=quality)
+        return buffer.getvalue()
+
+    @staticmethod
+    def size(url):
+        """
+        Method for getting size of a stored file by its URL.
+        """
+        if not url:
+            return 0
+        path = unquote(urlparse(url).path)
+        storage = Recipe._meta.get_field("image").storage
+        return storage.size(path[len(settings.MEDIA_URL) :])
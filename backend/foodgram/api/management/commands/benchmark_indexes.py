@@ -0,0 +1,148 @@
+import statistics
+import time
+
+from api.management.base import DisposableDatabaseCommand
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Index, Sum
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+)
+from users.models import Subscription, User
+
+LOOKUP_MODELS = (Recipe, Favorite, ShoppingCart, Subscription)
+# Single column foreign key indexes replaced by lookup indexes.
+BASELINE_INDEXES = (
+    (Recipe, "author"),
+    (Favorite, "user"),
+    (Favorite, "recipe"),
+    (ShoppingCart, "user"),
+    (ShoppingCart, "recipe"),
+    (Subscription, "user"),
+    (Subscription, "author"),
+)
+
+
+class Command(DisposableDatabaseCommand):
+    help = (
+        "Seeds synthetic data and compares query plans and timings "
+        "of hot API queries with plain foreign key indexes "
+        "and with lookup indexes. "
+        "Run it against a disposable database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=20000)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument(
+            "--skip-seed",
+            action="store_true",
+            help="Reuse data already in the database.",
+        )
+        parser.add_argument(
+            "--plans",
+            action="store_true",
+            help="Print query plans.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["skip_seed"]:
+            call_command(
+                "seed_data",
+                users=options["users"],
+                recipes=options["recipes"],
+                stdout=self.stdout,
+                yes_i_know=True,
+            )
+        self.repeat = options["repeat"]
+        self.plans = options["plans"]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        self.swap_indexes(lookup=False)
+        try:
+            before = self.measure("foreign key indexes")
+        finally:
+            self.swap_indexes(lookup=True)
+        after = self.measure("lookup indexes")
+
+        self.stdout.write(
+            "\nMedian, ms: foreign key indexes -> lookup indexes"
+        )
+        for name, timing in before.items():
+            self.stdout.write(
+                f"{name:<28} {timing:>9.3f} -> {after[name]:>9.3f}"
+            )
+
+    def swap_indexes(self, lookup):
+        """
+        Method for switching between lookup indexes
+        and baseline foreign key indexes.
+        """
+        baseline = [
+            (
+                model,
+                Index(
+                    fields=[field],
+                    name=f"benchmark_{model._meta.model_name}_{field}",
+                ),
+            )
+            for model, field in BASELINE_INDEXES
+        ]
+        lookups = [
+            (model, index)
+            for model in LOOKUP_MODELS
+            for index in model._meta.indexes
+        ]
+        add, remove = (lookups, baseline) if lookup else (baseline, lookups)
+        with connection.schema_editor() as editor:
+            for model, index in remove:
+                editor.remove_index(model, index)
+            for model, index in add:
+                editor.add_index(model, index)
+
+    def queries(self):
+        """
+        Querysets matching access patterns of the API.
+        """
+        user = (
+            User.objects.annotate(count=Count("favorite"))
+            .order_by("-count")
+            .first()
+        )
+        author = Recipe.objects.values_list("author", flat=True).first()
+        return {
+            "recipe list": Recipe.objects.with_user_flags(user)[:6],
+            "recipes by author": Recipe.objects.filter(author=author)[:6],
+            "favorited recipes": Recipe.objects.with_user_flags(user).filter(
+                is_favorited=True
+            )[:6],
+            "followed authors": Subscription.objects.filter(
+                user=user
+            ).values_list("author_id", flat=True),
+            "subscriptions": User.objects.filter(author__user=user)[:6],
+            "shopping list": RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user=user
+            )
+            .values("ingredient__name", "ingredient__measurement_unit")
+            .annotate(amount=Sum("amount")),
+        }
+
+    def measure(self, title):
+        self.stdout.write(f"\n=== {title} ===")
+        results = {}
+        for name, queryset in self.queries().items():
+            timings = []
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+            self.stdout.write(f"{name}: {results[name]:.3f} ms")
+            if self.plans:
+                self.stdout.write(queryset.explain())
+        return results
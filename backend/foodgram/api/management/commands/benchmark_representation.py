@@ -0,0 +1,174 @@
+import statistics
+import time
+
+from api.fragments import represent_recipes
+from api.management.base import DisposableDatabaseCommand
+from api.serializers import RecipeSerializer
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from recipes.models import Recipe
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from users.models import User
+
+
+class Command(DisposableDatabaseCommand):
+    help = (
+        "Checks that recipes represented from projected fragments "
+        "render byte for byte as RecipeSerializer output, then compares "
+        "CPU time of both paths on recipe list pages."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=20000)
+        parser.add_argument("--page-size", type=int, default=6)
+        parser.add_argument("--pages", type=int, default=50)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--skip-seed",
+            action="store_true",
+            help="Reuse data already in the database.",
+        )
+        parser.add_argument(
+            "--parity-only",
+            action="store_true",
+            help="Check output of every recipe and skip timings.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["skip_seed"]:
+            call_command(
+                "seed_data",
+                users=options["users"],
+                recipes=options["recipes"],
+                stdout=self.stdout,
+                yes_i_know=True,
+            )
+        self.cache = caches[settings.RECIPE_FRAGMENT_CACHE]
+        self.renderer = JSONRenderer()
+        viewer = (
+            User.objects.annotate(count=Count("favorite"))
+            .order_by("-count")
+            .first()
+        )
+        if viewer is None:
+            raise CommandError("Database has no users.")
+        requests = {
+            "anonymous": self.make_request(AnonymousUser()),
+            "user": self.make_request(viewer),
+        }
+        ids = list(Recipe.objects.values_list("pk", flat=True))
+        if not options["parity_only"]:
+            ids = ids[: options["pages"] * options["page_size"]]
+        pages = [
+            ids[start : start + options["page_size"]]
+            for start in range(0, len(ids), options["page_size"])
+        ]
+
+        for name, request in requests.items():
+            self.check_parity(name, request, pages)
+        if options["parity_only"]:
+            return
+
+        self.stdout.write(
+            f"\nCPU ms per page of {options['page_size']} recipes, "
+            f"median of {options['repeat']} runs over {len(pages)} pages"
+        )
+        for name, request in requests.items():
+            serializer = self.measure(
+                lambda page: self.serialize(page, request), pages, options
+            )
+            cold = self.measure(
+                lambda page: self.represent(page, request, cold=True),
+                pages,
+                options,
+            )
+            warm = self.measure(
+                lambda page: self.represent(page, request), pages, options
+            )
+            self.stdout.write(
+                f"{name:<10} serializer {serializer:>8.3f}  "
+                f"projection {cold:>8.3f} ({cold / serializer:.0%})  "
+                f"cached {warm:>8.3f} ({warm / serializer:.0%})"
+            )
+
+    @staticmethod
+    def make_request(user):
+        host = next(
+            (host for host in settings.ALLOWED_HOSTS if host.strip(".*")),
+            "localhost",
+        )
+        request = Request(
+            RequestFactory().get("/api/recipes/", HTTP_HOST=host.lstrip("."))
+        )
+        request.user = user
+        return request
+
+    def serialize(self, page, request):
+        """
+        Method for rendering a page with RecipeSerializer.
+        """
+        recipes = (
+            Recipe.objects.filter(pk__in=page)
+            .select_related("author")
+            .prefetch_related("recipe_ingredient__ingredient", "tags")
+            .with_user_flags(request.user)
+        )
+        serializer = RecipeSerializer(
+            recipes, many=True, context={"request": request}
+        )
+        return self.renderer.render(serializer.data)
+
+    def represent(self, page, request, cold=False):
+        """
+        Method for rendering a page from fragments.
+        """
+        if cold:
+            self.cache.clear()
+        recipes = (
+            Recipe.objects.filter(pk__in=page)
+            .only("id", "pub_date", "version")
+            .with_user_flags(request.user)
+        )
+        return self.renderer.render(represent_recipes(recipes, request))
+
+    def check_parity(self, name, request, pages):
+        """
+        Method for comparing rendered pages of both paths.
+        """
+        self.cache.clear()
+        for page in pages:
+            expected = self.serialize(page, request)
+            for cached in (False, True):
+                actual = self.represent(page, request)
+                if actual != expected:
+                    raise CommandError(
+                        f"Output differs for {name}, recipes {page}, "
+                        f"{'cached' if cached else 'built'} fragments:\n"
+                        f"{expected.decode()}\n{actual.decode()}"
+                    )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Output is identical for {name} on {len(pages)} pages."
+            )
+        )
+
+    def measure(self, render, pages, options):
+        """
+        Method for getting median CPU time of rendering a page.
+        """
+        timings = []
+        for _ in range(options["repeat"]):
+            start = time.process_time()
+            for page in pages:
+                render(page)
+            timings.append(
+                (time.process_time() - start) * 1000 / len(pages)
+            )
+        return statistics.median(timings)
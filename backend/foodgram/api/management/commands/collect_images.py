@@ -0,0 +1,68 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.variants import variant_names
+
+GRACE_PERIOD = 24 * 60 * 60
+
+
+class Command(BaseCommand):
+    help = (
+        "Removes stored recipe images and variants "
+        "not referenced by any recipe. "
+        "Files changed within grace period are kept, "
+        "as they may belong to recipes being saved. "
+        "Files are not removed with recipes, so run it periodically, "
+        "e.g. daily by cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace",
+            type=int,
+            default=GRACE_PERIOD,
+            help="Seconds since last save of a file to keep it.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list files to remove.",
+        )
+
+    def handle(self, *args, **options):
+        field = Recipe._meta.get_field("image")
+        storage = field.storage
+        referenced = set()
+        for name in (
+            Recipe.objects.exclude(image="")
+            .exclude(image=None)
+            .values_list("image", flat=True)
+            .iterator()
+        ):
+            referenced.add(name)
+            referenced.update(variant_names(name).values())
+        deadline = time.time() - options["grace"]
+        removed = size = 0
+        for directory, _, files in os.walk(storage.path(field.upload_to)):
+            for file in files:
+                path = os.path.join(directory, file)
+                name = os.path.relpath(path, storage.location).replace(
+                    os.sep, "/"
+                )
+                stat = os.stat(path)
+                if name in referenced or stat.st_mtime > deadline:
+                    continue
+                if options["dry_run"]:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+                removed += 1
+                size += stat.st_size
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Found' if options['dry_run'] else 'Removed'} "
+                f"{removed} unreferenced images, {size} bytes."
+            )
+        )
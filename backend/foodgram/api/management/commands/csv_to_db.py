@@ -1,8 +1,13 @@
 import csv
+import io
+import json
 import os
+from itertools import islice
 
+from api.versions import CATALOGUE, bump_version
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredient
 
 PATH_TO_CSV = os.path.join(
@@ -10,17 +15,149 @@ PATH_TO_CSV = os.path.join(
     "data",
     "ingredients.csv",
 )
+BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    """
+    Stream (name, measurement_unit) rows from csv file.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if row:
+                yield row[0], row[1]
+
+
+def read_json(path):
+    """
+    Get (name, measurement_unit) rows from json file.
+    """
+    with open(path, "r", encoding="utf-8") as file:
+        ingredients = json.load(file)
+    for ingredient in ingredients:
+        yield ingredient["name"], ingredient["measurement_unit"]
+
+
+class CSVStream(io.RawIOBase):
+    """
+    File-like object producing csv data from rows on demand.
+
+    Lets COPY consume any source without building the file in memory.
+    """
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = b""
+        self.count = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            line = io.StringIO()
+            csv.writer(line).writerow(row)
+            self.buffer += line.getvalue().encode("utf-8")
+            self.count += 1
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
 
 
 class Command(BaseCommand):
-    help = "Transfers data from csv file to database."
+    help = "Transfers ingredients from csv or json file to database."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default=PATH_TO_CSV,
+            help="Path to csv or json file with ingredients.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=BATCH_SIZE,
+            help="Number of ingredients inserted per query.",
+        )
+        parser.add_argument(
+            "--copy",
+            action="store_true",
+            help="Load data with COPY, PostgreSQL only.",
+        )
 
     def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.isfile(path):
+            raise CommandError(f"File {path} does not exist.")
+        if options["batch_size"] < 1:
+            raise CommandError("Batch size must be positive.")
+        rows = read_json(path) if path.endswith(".json") else read_csv(path)
+
         self.stdout.write("Start of data transferring.")
-        with open(str(PATH_TO_CSV), "r") as file:
-            reader = csv.reader(file)
-            for row in reader:
-                Ingredient.objects.get_or_create(
-                    name=row[0], measurement_unit=row[1]
+        with transaction.atomic():
+            if options["copy"]:
+                if connection.vendor != "postgresql":
+                    raise CommandError("COPY is supported by PostgreSQL only.")
+                total, inserted = self.copy(rows)
+            else:
+                total, inserted = self.bulk_insert(
+                    rows, options["batch_size"]
                 )
-        self.stdout.write(self.style.SUCCESS("Data is transferred!"))
+        if inserted:
+            bump_version(CATALOGUE)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Data is transferred! Inserted: {inserted}, "
+                f"skipped: {total - inserted}."
+            )
+        )
+
+    def bulk_insert(self, rows, batch_size):
+        """
+        Method for inserting ingredients in batches.
+
+        Existing ingredients are skipped by the unique constraint.
+        """
+        before = Ingredient.objects.count()
+        total = 0
+        while True:
+            batch = [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in islice(rows, batch_size)
+            ]
+            if not batch:
+                break
+            total += len(batch)
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        return total, Ingredient.objects.count() - before
+
+    def copy(self, rows):
+        """
+        Method for loading ingredients with COPY into temporary table
+        and moving new ones to ingredients table.
+        """
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        stream = CSVStream(rows)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMPORARY TABLE ingredient_import "
+                "(name varchar(200), measurement_unit varchar(200)) "
+                "ON COMMIT DROP"
+            )
+            cursor.copy_expert(
+                "COPY ingredient_import (name, measurement_unit) "
+                "FROM STDIN WITH (FORMAT csv)",
+                stream,
+            )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT DISTINCT name, measurement_unit "
+                "FROM ingredient_import "
+                "ON CONFLICT DO NOTHING"
+            )
+            inserted = cursor.rowcount
+        return stream.count, inserted
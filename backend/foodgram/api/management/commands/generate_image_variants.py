@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+from recipes.variants import generate_variants
+
+
+class Command(BaseCommand):
+    help = "Generates missing resized variants of recipe images."
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field("image").storage
+        names = (
+            Recipe.objects.exclude(image="")
+            .exclude(image=None)
+            .order_by()
+            .values_list("image", flat=True)
+            .distinct()
+        )
+        created = missing = 0
+        for name in names.iterator():
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f"Image not found: {name}")
+                continue
+            created += generate_variants(storage, name)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} variants, {missing} images not found."
+            )
+        )
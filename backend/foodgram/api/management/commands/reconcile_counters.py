@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.counters import recount_recipes, recount_users
+
+
+class Command(BaseCommand):
+    help = "Repairs favorites, shopping cart and recipes counters."
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        recipes = recount_recipes()
+        users = recount_users()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Counters are repaired for {recipes} recipes "
+                f"and {users} users."
+            )
+        )
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+from recipes.models import Recipe
+from recipes.variants import generate_variants
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves recipe images saved before content-addressed storage "
+        "to their hashed names. Old files are left for collect_images."
+    )
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field("image").storage
+        recipes = (
+            Recipe.objects.exclude(image="")
+            .exclude(image=None)
+            .values_list("pk", "image")
+        )
+        moved = missing = 0
+        for pk, name in recipes.iterator():
+            if storage.is_hashed(name):
+                continue
+            if not storage.exists(name):
+                missing += 1
+                self.stderr.write(f"Image of recipe {pk} not found: {name}")
+                continue
+            with storage.open(name) as content:
+                hashed = storage.save(name, content)
+            generate_variants(storage, hashed)
+            Recipe.objects.filter(pk=pk, image=name).update(
+                image=hashed, version=F("version") + 1
+            )
+            moved += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Moved {moved} images, {missing} images not found."
+            )
+        )
@@ -0,0 +1,239 @@
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from api.management.base import DisposableDatabaseCommand
+from django.core.management.base import CommandError
+from django.db import transaction
+from django.utils import timezone
+from recipes.counters import recount_recipes, recount_users
+from recipes.feeds import rebuild_feeds
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from users.models import Subscription, User
+
+BATCH_SIZE = 2000
+TAGS = (
+    ("Breakfast", "#E26C2D", "breakfast"),
+    ("Lunch", "#49B64E", "lunch"),
+    ("Dinner", "#8775D2", "dinner"),
+)
+
+
+class Command(DisposableDatabaseCommand):
+    help = "Fills database with synthetic users, recipes and relations."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=20000)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--favorites-per-user", type=int, default=20)
+        parser.add_argument("--carts-per-user", type=int, default=5)
+        parser.add_argument("--subscriptions-per-user", type=int, default=10)
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.0,
+            help=(
+                "Zipf exponent of authors, recipes and subscriptions "
+                "popularity, 0 for uniform data."
+            ),
+        )
+        parser.add_argument(
+            "--random-seed",
+            type=int,
+            default=None,
+            help="Seed for reproducible datasets.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["recipes"] < 1:
+            raise CommandError("At least one user and recipe are required.")
+        if options["skew"] < 0:
+            raise CommandError("Skew must not be negative.")
+        self.random = random.Random(options["random_seed"])
+        self.batch_size = options["batch_size"]
+        self.skew = options["skew"]
+        self.cum_weights = {}
+        self.prefix = f"seed{self.random.getrandbits(32):08x}"
+        with transaction.atomic():
+            tags = self.create_tags()
+            ingredients = self.get_ingredients()
+            users = self.create_users(options["users"])
+            recipes = self.create_recipes(users, options["recipes"])
+            self.create_recipe_relations(
+                recipes, tags, ingredients, options["ingredients_per_recipe"]
+            )
+            for model, per_user in (
+                (Favorite, options["favorites_per_user"]),
+                (ShoppingCart, options["carts_per_user"]),
+            ):
+                self.create_user_recipes(model, users, recipes, per_user)
+            self.create_subscriptions(
+                users, options["subscriptions_per_user"]
+            )
+            recount_recipes(Recipe.objects.filter(pk__in=recipes))
+            recount_users(User.objects.filter(pk__in=users))
+            rebuild_feeds(users)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Seeded {len(users)} users and {len(recipes)} recipes."
+            )
+        )
+
+    def sample(self, population, count):
+        return self.random.sample(population, min(count, len(population)))
+
+    def get_cum_weights(self, size):
+        """
+        Method for getting cumulative Zipf weights of population size.
+        """
+        if size not in self.cum_weights:
+            self.cum_weights[size] = list(
+                accumulate(
+                    1 / rank**self.skew for rank in range(1, size + 1)
+                )
+            )
+        return self.cum_weights[size]
+
+    def skewed_sample(self, population, count):
+        """
+        Method for sampling distinct items, the first items
+        of population being the most popular ones.
+        """
+        if not self.skew:
+            return self.sample(population, count)
+        count = min(count, len(population))
+        cum_weights = self.get_cum_weights(len(population))
+        chosen = set()
+        # Popular items repeat, a few extra draws fill up the sample.
+        for _ in range(3):
+            chosen.update(
+                self.random.choices(
+                    population, cum_weights=cum_weights, k=count - len(chosen)
+                )
+            )
+            if len(chosen) == count:
+                break
+        return list(chosen)
+
+    def create_tags(self):
+        for name, color, slug in TAGS:
+            Tag.objects.get_or_create(
+                slug=slug, defaults={"name": name, "color": color}
+            )
+        return list(Tag.objects.values_list("id", flat=True))
+
+    def get_ingredients(self):
+        ingredients = list(Ingredient.objects.values_list("id", flat=True))
+        if ingredients:
+            return ingredients
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"ingredient {number}", measurement_unit="g")
+            for number in range(500)
+        )
+        return list(Ingredient.objects.values_list("id", flat=True))
+
+    def create_users(self, count):
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f"{self.prefix}-{number}",
+                    email=f"{self.prefix}-{number}@example.org",
+                    first_name="Synthetic",
+                    last_name=f"User {number}",
+                    password="!",
+                )
+                for number in range(count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(
+            User.objects.filter(
+                username__startswith=f"{self.prefix}-"
+            ).values_list("id", flat=True)
+        )
+
+    def choose_author(self, users):
+        return self.skewed_sample(users, 1)[0]
+
+    def create_recipes(self, users, count):
+        now = timezone.now()
+        recipes = []
+        for number in range(count):
+            recipes.append(
+                Recipe(
+                    name=f"Recipe {number}",
+                    text="Synthetic recipe. " * 20,
+                    cooking_time=self.random.randint(1, 180),
+                    author_id=self.choose_author(users),
+                )
+            )
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        created = list(
+            Recipe.objects.filter(author_id__in=users).order_by("id")
+        )
+        for recipe in created:
+            recipe.pub_date = now - timedelta(
+                minutes=self.random.randint(0, 60 * 24 * 365)
+            )
+        Recipe.objects.bulk_update(
+            created, ["pub_date"], batch_size=self.batch_size
+        )
+        return [recipe.id for recipe in created]
+
+    def create_recipe_relations(self, recipes, tags, ingredients, per_recipe):
+        RecipeTag = Recipe.tags.through
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe_id=recipe, tag_id=tag)
+                for recipe in recipes
+                for tag in self.sample(tags, self.random.randint(1, 2))
+            ),
+            batch_size=self.batch_size,
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe,
+                    ingredient_id=ingredient,
+                    amount=self.random.randint(1, 500),
+                )
+                for recipe in recipes
+                for ingredient in self.sample(ingredients, per_recipe)
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def choose_recipes(self, recipes, count):
+        return self.skewed_sample(recipes, count)
+
+    def create_user_recipes(self, model, users, recipes, per_user):
+        model.objects.bulk_create(
+            (
+                model(user_id=user, recipe_id=recipe)
+                for user in users
+                for recipe in self.choose_recipes(recipes, per_user)
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
+
+    def create_subscriptions(self, users, per_user):
+        Subscription.objects.bulk_create(
+            (
+                Subscription(user_id=user, author_id=author)
+                for user in users
+                for author in self.skewed_sample(users, per_user)
+                if author != user
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
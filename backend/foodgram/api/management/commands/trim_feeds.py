@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.feeds import trim_feeds
+
+
+class Command(BaseCommand):
+    help = "Removes feed entries beyond FEED_LENGTH newest ones."
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        removed = trim_feeds()
+        self.stdout.write(
+            self.style.SUCCESS(f"Removed {removed} feed entries.")
+        )
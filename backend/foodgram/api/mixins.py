@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from api.pagination import RecipeCursorPagination
+from api.versions import CATALOGUE, get_version
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.response import Response
+
+catalogue_cache = OrderedDict()
+catalogue_cache_lock = threading.Lock()
+
+
+def catalogue_etag(request, *args, **kwargs):
+    return f'"{CATALOGUE}-{get_version(CATALOGUE)}"'
+
+
+def catalogue_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(
+        get_version(CATALOGUE) / 1_000_000, tz=timezone.utc
+    )
+
+
+catalogue_condition = method_decorator(
+    condition(
+        etag_func=catalogue_etag, last_modified_func=catalogue_last_modified
+    )
+)
+
+
+class CatalogueMixin:
+    """
+    Mixin for read-mostly catalogue viewsets of tags and ingredients.
+
+    Responses carry catalogue version as ETag and Last-Modified,
+    so conditional requests get 304 without querying the table.
+    Serialized lists are cached per catalogue version in a process-local
+    LRU cache of CATALOGUE_CACHE_SIZE entries.
+    """
+
+    @catalogue_condition
+    def list(self, request, *args, **kwargs):
+        version = get_version(CATALOGUE)
+        key = (version, request.get_full_path())
+        with catalogue_cache_lock:
+            data = catalogue_cache.get(key)
+            if data is not None:
+                catalogue_cache.move_to_end(key)
+        if data is None:
+            data = super().list(request, *args, **kwargs).data
+            with catalogue_cache_lock:
+                catalogue_cache[key] = data
+                while len(catalogue_cache) > settings.CATALOGUE_CACHE_SIZE:
+                    catalogue_cache.popitem(last=False)
+        return Response(data)
+
+    @catalogue_condition
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+
+class CursorPaginationMixin:
+    """
+    Mixin for viewsets with opt-in cursor pagination.
+
+    Cursor pagination is used when pagination_mode of viewset is "cursor"
+    or when requested with pagination=cursor query parameter.
+    """
+
+    cursor_pagination_class = RecipeCursorPagination
+    pagination_mode = "page"
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            mode = self.request.query_params.get(
+                "pagination", self.pagination_mode
+            )
+            if mode != "cursor":
+                return super().paginator
+            self._paginator = self.cursor_pagination_class()
+        return self._paginator
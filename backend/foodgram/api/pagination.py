@@ -1,5 +1,25 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = "limit"
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination for recipes by publication date and id.
+
+    Doesn't count rows and costs the same at any depth.
+    """
+
+    ordering = ("-pub_date", "-id")
+    page_size_query_param = "limit"
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Keyset pagination for feed entries by publication date and recipe.
+    """
+
+    ordering = ("-pub_date", "-recipe_id")
+    page_size_query_param = "limit"
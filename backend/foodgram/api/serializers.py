@@ -1,19 +1,20 @@
-from api.fields import Base64ImageField
+from functools import partial
+
+from api.cookable_index import cookable_index
+from api.fields import Base64ImageField, ImageVariantsField
+from api.loaders import SubscriptionLoader
+from api.telemetry import TimedSerializerMixin
 from django.db import transaction
+from django.db.models import F, FileField, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from recipes.models import (
-    Favorite,
-    Ingredient,
-    Recipe,
-    RecipeIngredient,
-    ShoppingCart,
-    Tag,
-)
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from rest_framework import serializers
-from users.models import Subscription, User
+from users.models import User
+
+BULK_RECIPES_MAX_COUNT = 100
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     """
     Serializer for user model.
     """
@@ -36,12 +37,10 @@ class CustomUserSerializer(UserSerializer):
         """
         Method for checking if current user is subscribed to viewed author.
         """
-        if not self.context:
+        request = self.context.get("request")
+        if request is None:
             return False
-        subscription = Subscription.objects.filter(
-            user=self.context.get("request").user.id, author=data
-        )
-        return subscription.exists()
+        return SubscriptionLoader.for_request(request).is_subscribed(data)
 
 
 class CustomUserCreateSerializer(UserCreateSerializer):
@@ -65,9 +64,8 @@ class UserSubscriptionSerializer(CustomUserSerializer):
     Serializer for users subscriptions.
     """
 
-    is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -85,6 +83,8 @@ class UserSubscriptionSerializer(CustomUserSerializer):
     def get_recipes(self, data):
         """
         Method for getting user's recipes.
+
+        Recipes are expected to be prefetched and limited by the view.
         """
         request = self.context.get("request")
         serializer = RecipeListSerializer(
@@ -92,26 +92,8 @@ class UserSubscriptionSerializer(CustomUserSerializer):
         )
         return serializer.data
 
-    def get_is_subscribed(self, data):
-        """
-        Method for checking if current user is subscribed to viewed author.
-        """
-        if not self.context:
-            return False
-        subscription = Subscription.objects.filter(
-            user=self.context.get("request").user.id, author=data
-        )
-        return subscription.exists()
-
-    def get_recipes_count(self, data):
-        """
-        Method for counting user's recipes.
-        """
-        recipes = Recipe.objects.filter(author=data)
-        return recipes.count()
-
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for tags.
     """
@@ -121,7 +103,9 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "color", "slug")
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """
     Serializer for ingredients.
     """
@@ -131,22 +115,45 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "measurement_unit")
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     """
     Serializer for listing a recipe.
     """
 
+    image_variants = ImageVariantsField(source="image")
+
     class Meta:
         model = Recipe
         fields = (
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
         read_only_fields = ("__all__",)
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    """
+    Serializer for recipe ids of bulk requests.
+    """
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_MAX_COUNT,
+    )
+
+    def validate_recipes(self, recipes):
+        """
+        Method for removing repeated ids keeping their order.
+        """
+        return list(dict.fromkeys(recipes))
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """
     Serializer for nested ingredient field in listed recipe.
@@ -167,16 +174,14 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     Serializer for nested ingredient field in created recipe.
     """
 
-    id = serializers.PrimaryKeyRelatedField(
-        source="ingredient", queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = RecipeIngredient
         fields = ("id", "amount")
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for listing a recipe.
     """
@@ -187,8 +192,9 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField()
-    is_favorited = serializers.SerializerMethodField(read_only=True)
-    is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
+    image_variants = ImageVariantsField(source="image")
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -199,29 +205,23 @@ class RecipeSerializer(serializers.ModelSerializer):
             "ingredients",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
             "is_favorited",
             "is_in_shopping_cart",
         )
 
-    def get_is_favorited(self, data):
-        """
-        Method for checking if recipe is favorited by current user.
-        """
-        favorited = Favorite.objects.filter(
-            user=self.context.get("request").user.id, recipe=data
-        )
-        return favorited.exists()
 
-    def get_is_in_shopping_cart(self, data):
-        """
-        Method for checking if recipe is in user's shopping cart.
-        """
-        shopping_cart = ShoppingCart.objects.filter(
-            user=self.context.get("request").user.id, recipe=data
-        )
-        return shopping_cart.exists()
+class CookableRecipeSerializer(RecipeSerializer):
+    """
+    Serializer for recipes found by available ingredients.
+    """
+
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ("missing_count",)
 
 
 class RecipeCreateSerializer(serializers.ModelSerializer):
@@ -230,6 +230,9 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
     """
 
     ingredients = RecipeIngredientCreateSerializer(many=True, write_only=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False
+    )
     author = serializers.HiddenField(default=serializers.CurrentUserDefault())
     image = Base64ImageField()
 
@@ -245,6 +248,80 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             "author",
         )
 
+    def get_objects(self, model, pks):
+        """
+        Method for getting objects by primary keys in one query.
+        """
+        objects = model.objects.in_bulk(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                [
+                    serializers.PrimaryKeyRelatedField.default_error_messages[
+                        "does_not_exist"
+                    ].format(pk_value=pk)
+                    for pk in missing
+                ]
+            )
+        return objects
+
+    def validate_tags(self, tags):
+        """
+        Method for getting tags in one query.
+        """
+        objects = self.get_objects(Tag, list(dict.fromkeys(tags)))
+        return list(objects.values())
+
+    def validate_ingredients(self, ingredients):
+        """
+        Method for checking that ingredients are not repeated
+        and getting them in one query.
+        """
+        ingredient_ids = [
+            ingredient_data["id"] for ingredient_data in ingredients
+        ]
+        if len(ingredient_ids) != len(set(ingredient_ids)):
+            raise serializers.ValidationError("Ingredients must be unique.")
+        objects = self.get_objects(Ingredient, ingredient_ids)
+        return [
+            {
+                "ingredient": objects[ingredient_data["id"]],
+                "amount": ingredient_data["amount"],
+            }
+            for ingredient_data in ingredients
+        ]
+
+    def is_valid(self, raise_exception=False):
+        """
+        Method for validating a recipe.
+
+        Chunked upload of rejected image is closed and kept,
+        so it can be referenced again.
+        """
+        valid = False
+        try:
+            valid = super().is_valid(raise_exception=raise_exception)
+        finally:
+            upload = self.fields["image"].upload
+            if not valid and upload is not None:
+                upload.close()
+        return valid
+
+    def save(self, **kwargs):
+        """
+        Method for saving a recipe and removing chunked upload of its image.
+        """
+        upload = self.fields["image"].upload
+        if upload is None:
+            return super().save(**kwargs)
+        try:
+            instance = super().save(**kwargs)
+        except Exception:
+            upload.close()
+            raise
+        upload.discard()
+        return instance
+
     @transaction.atomic
     def create(self, validated_data):
         """
@@ -252,42 +329,133 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         """
         ingredients = validated_data.pop("ingredients")
         instance = super().create(validated_data)
-        ingredients_bulk_list = []
-        for ingredient_data in ingredients:
-            ingredients_bulk_list.append(
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=ingredient_data["ingredient"],
-                    amount=ingredient_data["amount"],
-                )
+        # New recipe can't be favorited or added to shopping cart yet.
+        instance.is_favorited = False
+        instance.is_in_shopping_cart = False
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=instance,
+                ingredient=ingredient_data["ingredient"],
+                amount=ingredient_data["amount"],
             )
-        RecipeIngredient.objects.bulk_create(ingredients_bulk_list)
+            for ingredient_data in ingredients
+        )
+        self.index_ingredients(instance, ingredients)
         return instance
 
     @transaction.atomic
     def update(self, instance, validated_data):
         """
         Method for updating a recipe.
+
+        Only changed fields, tags and ingredients are written,
+        version is increased if anything is changed.
+        Image is compared by content.
         """
-        ingredients = validated_data.pop("ingredients")
-        instance = super().update(instance, validated_data)
-        RecipeIngredient.objects.filter(recipe=instance).delete()
-        ingredients_bulk_list = []
+        ingredients = validated_data.pop("ingredients", None)
+        tags = validated_data.pop("tags", None)
+        changed_fields = []
+        for name, value in validated_data.items():
+            field = instance._meta.get_field(name)
+            if field.is_relation:
+                current, value = getattr(instance, field.attname), value.pk
+                name = field.attname
+            elif isinstance(field, FileField) and value:
+                # Re-uploaded file is unchanged if its content is.
+                current = getattr(instance, name).name
+                if current == field.storage.hashed_name(
+                    field.generate_filename(instance, value.name), value
+                ):
+                    continue
+            else:
+                current = getattr(instance, name)
+            if current != value:
+                setattr(instance, name, value)
+                changed_fields.append(name)
+        changed = bool(changed_fields)
+        if tags is not None:
+            changed |= self.update_tags(instance, tags)
+        if ingredients is not None:
+            changed |= self.update_ingredients(instance, ingredients)
+        if changed:
+            instance.version = F("version") + 1
+            instance.save(update_fields=changed_fields + ["version"])
+            instance.refresh_from_db(fields=["version"])
+        return instance
+
+    def update_tags(self, instance, tags):
+        """
+        Method for adding new and removing dropped tags of a recipe.
+
+        Returns whether tags are changed.
+        """
+        current = {tag.pk for tag in instance.tags.all()}
+        new = {tag.pk for tag in tags}
+        if current - new:
+            instance.tags.remove(*(current - new))
+        if new - current:
+            instance.tags.add(*(new - current))
+        return current != new
+
+    def update_ingredients(self, instance, ingredients):
+        """
+        Method for applying difference of recipe ingredients.
+
+        Removed rows are deleted, changed amounts are updated
+        and new rows are created, other rows are left untouched.
+        Returns whether ingredients are changed.
+        """
+        current = {
+            row.ingredient_id: row for row in instance.recipe_ingredient.all()
+        }
+        changed, created = [], []
         for ingredient_data in ingredients:
-            ingredients_bulk_list.append(
-                RecipeIngredient(
-                    recipe=instance,
-                    ingredient=ingredient_data["ingredient"],
-                    amount=ingredient_data["amount"],
+            ingredient = ingredient_data["ingredient"]
+            row = current.pop(ingredient.pk, None)
+            if row is None:
+                created.append(
+                    RecipeIngredient(
+                        recipe=instance,
+                        ingredient=ingredient,
+                        amount=ingredient_data["amount"],
+                    )
                 )
-            )
-        RecipeIngredient.objects.bulk_create(ingredients_bulk_list)
-        return instance
+            elif row.amount != ingredient_data["amount"]:
+                row.amount = ingredient_data["amount"]
+                changed.append(row)
+        if current:
+            RecipeIngredient.objects.filter(
+                pk__in=[row.pk for row in current.values()]
+            ).delete()
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ["amount"])
+        if created:
+            RecipeIngredient.objects.bulk_create(created)
+        if current or created:
+            self.index_ingredients(instance, ingredients)
+        return bool(current or changed or created)
+
+    def index_ingredients(self, instance, ingredients):
+        """
+        Method for refreshing cookable recipes index after commit.
+        """
+        ingredient_ids = [
+            ingredient_data["ingredient"].id for ingredient_data in ingredients
+        ]
+        cookable_index.record_changes([instance.pk])
+        transaction.on_commit(
+            partial(cookable_index.set_recipe, instance.pk, ingredient_ids)
+        )
 
     def to_representation(self, instance):
         """
         Method for representing a recipe.
+
+        Relations are fetched again, because they are changed on save.
         """
+        prefetch_related_objects(
+            [instance], "recipe_ingredient__ingredient", "tags"
+        )
         serializer = RecipeSerializer(
             instance, context={"request": self.context.get("request")}
         )
@@ -0,0 +1,105 @@
+from functools import partial
+
+from api.authentication import token_cache
+from api.cookable_index import cookable_index
+from api.ingredient_index import ingredient_index
+from api.versions import CATALOGUE, bump_version
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.dispatch import receiver
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.authtoken.models import Token
+from users.models import User
+
+AUTH_FIELDS = ("password", "is_active", "is_staff", "is_superuser")
+
+
+@receiver(post_save, sender=Ingredient)
+def index_ingredient(sender, instance, **kwargs):
+    """
+    Add saved ingredient to the autocomplete index.
+    """
+    transaction.on_commit(partial(ingredient_index.add, instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+def unindex_ingredient(sender, instance, **kwargs):
+    """
+    Remove deleted ingredient from the autocomplete index.
+    """
+    transaction.on_commit(partial(ingredient_index.remove, instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_catalogue_version(sender, **kwargs):
+    """
+    Invalidate cached tags and ingredients responses.
+
+    Version changes once the transaction commits, so a response cached
+    under the new version is never built from uncommitted state.
+    """
+    transaction.on_commit(partial(bump_version, CATALOGUE))
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_recipe(sender, instance, **kwargs):
+    """
+    Remove deleted recipe from the cookable recipes index.
+    """
+    cookable_index.record_changes([instance.pk])
+    transaction.on_commit(partial(cookable_index.remove_recipe, instance.pk))
+
+
+@receiver(pre_delete, sender=Ingredient)
+def record_ingredient_recipes(sender, instance, **kwargs):
+    """
+    Record recipes losing deleted ingredient for cookable recipes index.
+    """
+    recipe_ids = RecipeIngredient.objects.filter(
+        ingredient=instance
+    ).values_list("recipe_id", flat=True)
+    cookable_index.record_changes(list(recipe_ids))
+    transaction.on_commit(cookable_index.sync)
+
+
+@receiver(post_delete, sender=Token)
+def discard_token(sender, instance, **kwargs):
+    """
+    Invalidate cached token on logout or user deletion.
+    """
+    transaction.on_commit(partial(token_cache.discard, instance.key))
+
+
+@receiver(pre_save, sender=User)
+def check_auth_fields(sender, instance, update_fields, **kwargs):
+    """
+    Remember if password, activity or permissions of user change.
+    """
+    instance._auth_changed = False
+    if instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(
+        AUTH_FIELDS
+    ):
+        return
+    saved = User.objects.filter(pk=instance.pk).values(*AUTH_FIELDS).first()
+    instance._auth_changed = saved is not None and any(
+        saved[field] != getattr(instance, field) for field in AUTH_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """
+    Invalidate cached tokens of user after auth fields change.
+    """
+    if not created and getattr(instance, "_auth_changed", False):
+        transaction.on_commit(partial(token_cache.discard_user, instance.pk))
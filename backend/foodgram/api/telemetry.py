@@ -0,0 +1,301 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from ipaddress import ip_address, ip_network
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+# Other methods share one label, so clients can't add label values.
+METHODS = ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+
+current_stats = ContextVar("current_stats", default=None)
+serializer_depth = ContextVar("serializer_depth", default=0)
+
+
+class RequestStats:
+    """
+    Measurements of a single request.
+    """
+
+    __slots__ = ("view", "queries", "sql_time", "serializer_time")
+
+    def __init__(self):
+        self.view = "unresolved"
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_time += time.perf_counter() - start
+
+
+class Histogram:
+    """
+    Prometheus histogram with cumulative buckets per label values.
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, label_values, value):
+        position = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [
+                    [0] * (len(self.buckets) + 1),
+                    0.0,
+                ]
+            series[0][position] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = [
+                (label_values, list(counts), total)
+                for label_values, (counts, total) in self._series.items()
+            ]
+        for label_values, counts, total in sorted(series):
+            labels = ",".join(
+                f'{label}="{value}"'
+                for label, value in zip(self.labels, label_values)
+            )
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(
+                    f'{self.name}_bucket{{{labels},le="{bound}"}} '
+                    f"{cumulative}"
+                )
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Prometheus counter per label values.
+    """
+
+    def __init__(self, name, documentation, labels):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = (
+                self._series.get(label_values, 0) + amount
+            )
+
+    def expose(self):
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_values, count in series:
+            labels = ",".join(
+                f'{label}="{value}"'
+                for label, value in zip(self.labels, label_values)
+            )
+            lines.append(f"{self.name}_total{{{labels}}} {count}")
+        return lines
+
+
+REQUEST_DURATION = Histogram(
+    "foodgram_request_duration_seconds",
+    "Total request processing time.",
+    ("view", "method"),
+    DURATION_BUCKETS,
+)
+REQUEST_QUERIES = Histogram(
+    "foodgram_request_queries",
+    "SQL queries executed per request.",
+    ("view", "method"),
+    QUERY_BUCKETS,
+)
+REQUEST_SQL_DURATION = Histogram(
+    "foodgram_request_sql_seconds",
+    "Time spent in SQL queries per request.",
+    ("view", "method"),
+    DURATION_BUCKETS,
+)
+REQUEST_SERIALIZER_DURATION = Histogram(
+    "foodgram_request_serializer_seconds",
+    "Time spent in serializers representation per request.",
+    ("view", "method"),
+    DURATION_BUCKETS,
+)
+RESPONSE_SIZE = Histogram(
+    "foodgram_response_size_bytes",
+    "Size of response body, streaming responses excluded.",
+    ("view", "method"),
+    SIZE_BUCKETS,
+)
+HISTOGRAMS = [
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    REQUEST_SQL_DURATION,
+    REQUEST_SERIALIZER_DURATION,
+    RESPONSE_SIZE,
+]
+TOKEN_CACHE_REQUESTS = Counter(
+    "foodgram_token_cache_requests",
+    "Token authentications by cache result.",
+    ("result",),
+)
+COUNTERS = [TOKEN_CACHE_REQUESTS]
+
+
+def method_label(method):
+    """
+    Get label of request method, "other" for unknown methods.
+    """
+    return method if method in METHODS else "other"
+
+
+def view_name(view_func, method):
+    """
+    Get name of view as ViewSet.action for DRF views.
+    """
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return getattr(view_func, "__name__", "view")
+    actions = getattr(view_func, "actions", None) or {}
+    method = method_label(method).lower()
+    return f"{cls.__name__}.{actions.get(method, method)}"
+
+
+class TelemetryMiddleware:
+    """
+    Middleware recording SQL, serializer and total time,
+    number of queries and response size of every request.
+
+    Measurements are aggregated in histograms of /metrics endpoint
+    and, when SERVER_TIMING setting is enabled,
+    sent in Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query)
+                    )
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        total = time.perf_counter() - start
+
+        labels = (stats.view, method_label(request.method))
+        REQUEST_DURATION.observe(labels, total)
+        REQUEST_QUERIES.observe(labels, stats.queries)
+        REQUEST_SQL_DURATION.observe(labels, stats.sql_time)
+        REQUEST_SERIALIZER_DURATION.observe(labels, stats.serializer_time)
+        if not response.streaming:
+            RESPONSE_SIZE.observe(labels, len(response.content))
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = (
+                f'db;dur={stats.sql_time * 1000:.2f};'
+                f'desc="{stats.queries} queries", '
+                f"serializer;dur={stats.serializer_time * 1000:.2f}, "
+                f"total;dur={total * 1000:.2f}"
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = current_stats.get()
+        if stats is not None:
+            stats.view = view_name(view_func, request.method)
+
+
+@contextmanager
+def timed_representation():
+    """
+    Add time of the outermost representation
+    to serializer time of the current request.
+    """
+    stats = current_stats.get()
+    if stats is None or serializer_depth.get():
+        yield
+        return
+    token = serializer_depth.set(1)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serializer_time += time.perf_counter() - start
+        serializer_depth.reset(token)
+
+
+class TimedSerializerMixin:
+    """
+    Mixin adding time of the outermost representation
+    to serializer time of the current request.
+    """
+
+    def to_representation(self, instance):
+        with timed_representation():
+            return super().to_representation(instance)
+
+
+def metrics(request):
+    """
+    View exposing request histograms and counters
+    in Prometheus text format.
+
+    Metrics are kept per process. The endpoint is not routed
+    by nginx and is meant for scraping backend containers directly,
+    only from addresses of METRICS_ALLOWED_NETWORKS.
+    """
+    try:
+        address = ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        address = None
+    if address is None or not any(
+        address in ip_network(network)
+        for network in settings.METRICS_ALLOWED_NETWORKS
+    ):
+        raise Http404
+    lines = []
+    for metric in HISTOGRAMS + COUNTERS:
+        lines.extend(metric.expose())
+    return HttpResponse(
+        "\n".join(lines) + "\n",
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
@@ -0,0 +1,214 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from api.authentication import TokenCache
+from api.fragments import represent_recipes
+from api.serializers import RecipeSerializer
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.test import RequestFactory, TestCase, override_settings
+from PIL import Image
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Tag,
+)
+from recipes.variants import variant_names
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from users.models import Subscription, User
+
+
+class RecipeFragmentsTest(TestCase):
+    """
+    Recipes represented from cached fragments must render
+    byte for byte as RecipeSerializer output.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email="author@example.com",
+            username="author",
+            first_name="Author",
+            last_name="Cook",
+        )
+        cls.viewer = User.objects.create(
+            email="viewer@example.com", username="viewer"
+        )
+        Subscription.objects.create(user=cls.viewer, author=cls.author)
+        tags = [
+            Tag.objects.create(name=name, color=color, slug=name)
+            for name, color in (("lunch", "#00FF00"), ("dinner", "#0000FF"))
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=name, measurement_unit="g")
+            for name in ("salt", "sugar", "flour")
+        ]
+        cls.with_image = Recipe.objects.create(
+            author=cls.author, name="Bread", text="Bake.", cooking_time=60
+        )
+        cls.with_image.image.save("photo.png", ContentFile(cls.make_image()))
+        cls.without_image = Recipe.objects.create(
+            author=cls.viewer, name="Soup", text="Boil.", cooking_time=20
+        )
+        for recipe in (cls.with_image, cls.without_image):
+            recipe.tags.set(tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=5
+                )
+                for ingredient in reversed(ingredients)
+            )
+        Favorite.objects.create(user=cls.viewer, recipe=cls.with_image)
+        ShoppingCart.objects.create(user=cls.viewer, recipe=cls.without_image)
+
+    def setUp(self):
+        caches[settings.RECIPE_FRAGMENT_CACHE].clear()
+        self.renderer = JSONRenderer()
+
+    @staticmethod
+    def make_image():
+        buffer = BytesIO()
+        Image.new("RGB", (640, 480), "orange").save(buffer, "PNG")
+        return buffer.getvalue()
+
+    @staticmethod
+    def make_request(user):
+        request = Request(RequestFactory().get("/api/recipes/"))
+        request.user = user
+        return request
+
+    def serialize(self, request):
+        recipes = (
+            Recipe.objects.select_related("author")
+            .prefetch_related("recipe_ingredient__ingredient", "tags")
+            .with_user_flags(request.user)
+        )
+        return self.renderer.render(
+            RecipeSerializer(
+                recipes, many=True, context={"request": request}
+            ).data
+        )
+
+    def represent(self, request):
+        recipes = Recipe.objects.only("id", "pub_date", "version")
+        recipes = recipes.with_user_flags(request.user)
+        return self.renderer.render(represent_recipes(recipes, request))
+
+    def test_parity(self):
+        for user in (AnonymousUser(), self.viewer):
+            request = self.make_request(user)
+            expected = self.serialize(request)
+            for fragments in ("built", "cached"):
+                with self.subTest(user=str(user), fragments=fragments):
+                    self.assertEqual(self.represent(request), expected)
+
+    def test_image_variants(self):
+        request = self.make_request(self.viewer)
+        representations = {
+            recipe["id"]: recipe
+            for recipe in represent_recipes(
+                Recipe.objects.with_user_flags(self.viewer), request
+            )
+        }
+        with_image = representations[self.with_image.pk]
+        self.assertTrue(with_image["image"].startswith("http://testserver/"))
+        self.assertEqual(
+            set(with_image["image_variants"]), {"full", "card", "thumbnail"}
+        )
+        storage = self.with_image.image.storage
+        for name in variant_names(self.with_image.image.name).values():
+            self.assertTrue(storage.exists(name))
+        self.assertTrue(with_image["is_favorited"])
+        self.assertTrue(with_image["author"]["is_subscribed"])
+        without_image = representations[self.without_image.pk]
+        self.assertIsNone(without_image["image"])
+        self.assertIsNone(without_image["image_variants"])
+        self.assertTrue(without_image["is_in_shopping_cart"])
+
+    def test_endpoints(self):
+        token = Token.objects.create(user=self.viewer)
+        for user, headers in (
+            (AnonymousUser(), {}),
+            (self.viewer, {"HTTP_AUTHORIZATION": f"Token {token.key}"}),
+        ):
+            with self.subTest(user=str(user)):
+                results = self.client.get("/api/recipes/", **headers).json()[
+                    "results"
+                ]
+                self.assertEqual(
+                    self.renderer.render(results),
+                    self.serialize(self.make_request(user)),
+                )
+                recipe = self.client.get(
+                    f"/api/recipes/{self.with_image.pk}/", **headers
+                ).json()
+                self.assertIn(recipe, results)
+
+
+@override_settings(TOKEN_CACHE="default")
+class SharedTokenCacheTest(TestCase):
+    """
+    Tokens discarded by one process must not be accepted
+    from the shared token cache by another one.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email="user@example.com", username="user"
+        )
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.token_cache = TokenCache()
+        self.other_process = TokenCache()
+
+    def cache_token(self):
+        cached, generation = self.token_cache.get(self.token.key)
+        self.assertIsNone(cached)
+        self.token_cache.set(
+            self.token.key, self.user, self.token, generation
+        )
+        cached, _ = self.token_cache.get(self.token.key)
+        self.assertEqual(cached[0].pk, self.user.pk)
+
+    def test_discard(self):
+        self.cache_token()
+        self.other_process.discard(self.token.key)
+        self.assertIsNone(self.token_cache.get(self.token.key)[0])
+
+    def test_discard_user(self):
+        self.cache_token()
+        self.other_process.discard_user(self.user.pk)
+        self.assertIsNone(self.token_cache.get(self.token.key)[0])
+
+    def test_discard_while_reading(self):
+        _, generation = self.token_cache.get(self.token.key)
+        self.other_process.discard_user(self.user.pk)
+        self.token_cache.set(
+            self.token.key, self.user, self.token, generation
+        )
+        self.assertIsNone(self.token_cache.get(self.token.key)[0])
@@ -0,0 +1,138 @@
+import json
+import os
+import re
+import secrets
+import time
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+
+UPLOAD_PREFIX = "upload:"
+TOKEN = re.compile(r"^[0-9a-f]{32}$")
+CHUNK_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class ChunkedUpload(File):
+    """
+    Completed chunked upload.
+
+    Exposes temporary_file_path so images are verified from disk.
+    Upload is removed by discard once it is saved.
+    """
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def discard(self):
+        """
+        Method for closing the upload and removing its files.
+        """
+        self.close()
+        remove_upload(self.file.name)
+
+
+def upload_path(user, token):
+    if not TOKEN.match(token):
+        raise UploadError("Invalid upload token.")
+    return os.path.join(settings.UPLOAD_ROOT, str(user.pk), token)
+
+
+def get_offset(path):
+    return os.path.getsize(path) if os.path.exists(path) else None
+
+
+def get_size(path):
+    with open(f"{path}.json", "r") as file:
+        return json.load(file)["size"]
+
+
+def remove_upload(path):
+    for name in (path, f"{path}.json"):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+
+def clear_expired(user):
+    """
+    Remove user's uploads older than UPLOAD_EXPIRE seconds.
+    """
+    directory = os.path.join(settings.UPLOAD_ROOT, str(user.pk))
+    if not os.path.isdir(directory):
+        return
+    expired = time.time() - settings.UPLOAD_EXPIRE
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) < expired:
+            os.remove(path)
+
+
+def start_upload(user, size):
+    """
+    Start an upload of given size and get its token.
+    """
+    if not 0 < size <= settings.RECIPE_IMAGE_MAX_SIZE:
+        raise UploadError(
+            f"Upload size must be from 1 to "
+            f"{settings.RECIPE_IMAGE_MAX_SIZE} bytes."
+        )
+    clear_expired(user)
+    token = secrets.token_hex(16)
+    path = upload_path(user, token)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.json", "w") as file:
+        json.dump({"size": size}, file)
+    open(path, "wb").close()
+    return token
+
+
+def append_chunk(user, token, offset, stream):
+    """
+    Append chunk read from stream at given offset and get new offset.
+
+    Offset must match already received size, so interrupted uploads
+    can be resumed from the offset reported by the server.
+    """
+    path = upload_path(user, token)
+    current = get_offset(path)
+    if current is None:
+        raise UploadError("Upload not found.")
+    if offset != current:
+        raise UploadError(f"Upload offset must be {current}.")
+    size = get_size(path)
+    with open(path, "ab") as file:
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            current += len(chunk)
+            if current > size:
+                file.truncate(offset)
+                raise UploadError("Chunk exceeds upload size.")
+            file.write(chunk)
+    return current
+
+
+def get_upload(user, token):
+    """
+    Get completed upload as file or None.
+    """
+    try:
+        path = upload_path(user, token)
+        if get_offset(path) != get_size(path):
+            return None
+    except (UploadError, OSError):
+        return None
+    try:
+        with Image.open(path) as image:
+            extension = image.format.lower()
+    except Exception:
+        # Not an image, rejected by image field validation.
+        extension = "upload"
+    return ChunkedUpload(open(path, "rb"), name=f"{token}.{extension}")
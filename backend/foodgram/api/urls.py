@@ -3,6 +3,7 @@ from api.views import (
     RecipeViewSet,
     CustomUserViewSet,
     TagViewSet,
+    UploadViewSet,
 )
 from django.urls import include, path, re_path
 from rest_framework import routers
@@ -12,6 +13,7 @@ router.register("users", CustomUserViewSet, basename="subscriptions")
 router.register("tags", TagViewSet, basename="tags")
 router.register("recipes", RecipeViewSet, basename="recipes")
 router.register("ingredients", IngredientViewSet, basename="ingredients")
+router.register("uploads", UploadViewSet, basename="uploads")
 
 
 urlpatterns = [
@@ -0,0 +1,32 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOGUE = "catalogue"
+
+
+def get_version(namespace):
+    """
+    Get current version of namespace, starting it on first use.
+
+    Version is a timestamp in microseconds of the last change,
+    stored in the default cache. It is shared between processes only
+    when the cache is, otherwise it expires after VERSION_TTL seconds,
+    so changes made by other processes are seen within that time.
+    """
+    key = f"version:{namespace}"
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, timeout=settings.VERSION_TTL)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(namespace):
+    """
+    Mark namespace as changed and get its new version.
+    """
+    version = time.time_ns() // 1000
+    cache.set(f"version:{namespace}", version, timeout=settings.VERSION_TTL)
+    return version
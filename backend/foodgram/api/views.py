@@ -1,22 +1,47 @@
 
+from itertools import chain
+
+from api.cookable_index import cookable_index
+from api.exporters import SHOPPING_LIST_EXPORTERS
 from api.filters import IngredientFilter, RecipeFilter
+from api.fragments import represent_recipes
+from api.mixins import CatalogueMixin, CursorPaginationMixin
+from api.pagination import FeedCursorPagination
 from api.permissions import Admin, AuthUser, Guest
+from api.renderers import CSVRenderer, PlainTextRenderer, PrintRenderer
 from api.serializers import (
+    CookableRecipeSerializer,
     CustomUserSerializer,
     IngredientSerializer,
     RecipeCreateSerializer,
+    RecipeIdsSerializer,
     RecipeListSerializer,
     RecipeSerializer,
     TagSerializer,
     UserSubscriptionSerializer,
 )
-from django.db.models import Sum
-from django.http import HttpResponse
+from api.uploads import (
+    UploadError,
+    append_chunk,
+    get_offset,
+    start_upload,
+    upload_path,
+)
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Sum, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from recipes.counters import (
+    RECIPE_COUNTERS,
+    add_user_recipes,
+    change_counter,
+    remove_user_recipes,
+)
 from recipes.models import (
     Favorite,
+    FeedEntry,
     Ingredient,
     Recipe,
     RecipeIngredient,
@@ -25,12 +50,24 @@ from recipes.models import (
 )
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from users.models import Subscription, User
 
+SHOPPING_LIST_CHUNK_SIZE = 500
+FRAGMENT_ACTIONS = ("list", "retrieve", "feed")
+USER_RECIPE_FLAGS = {
+    Favorite: "is_favorited",
+    ShoppingCart: "is_in_shopping_cart",
+}
+
 
 class TagViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    CatalogueMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     """
     Viewset for list and retrieve tags.
@@ -46,7 +83,10 @@ class TagViewSet(
 
 
 class IngredientViewSet(
-    mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet
+    CatalogueMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
 ):
     """
     Viewset for list and retrieve ingredients.
@@ -65,7 +105,7 @@ class IngredientViewSet(
     search_fields = ("^name",)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     """
     Viewset for recipes.
 
@@ -75,6 +115,11 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     Users can filter recipes by author, tags,
     if it in shopping cart or favorited.
+
+    Infinite scroll clients can use cursor pagination.
+
+    Listed recipes are represented from cached fragments
+    shared by all users.
     """
 
     permission_classes = [Admin | AuthUser | Guest]
@@ -85,12 +130,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """
         Method for getting queryset.
+
+        Actions represented from fragments load only columns
+        needed for cache keys and pagination.
         """
-        recipes = Recipe.objects.prefetch_related(
-            "recipe_ingredient__ingredient", "tags"
+        if self.action in FRAGMENT_ACTIONS:
+            return Recipe.objects.only(
+                "id", "pub_date", "version"
+            ).with_user_flags(self.request.user)
+        recipes = (
+            Recipe.objects.select_related("author")
+            .prefetch_related("recipe_ingredient__ingredient", "tags")
+            .with_user_flags(self.request.user)
         )
         return recipes
 
+    def list(self, request, *args, **kwargs):
+        """
+        Method for listing recipes.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(represent_recipes(list(queryset), request))
+        return self.get_paginated_response(represent_recipes(page, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Method for getting a recipe.
+        """
+        representations = represent_recipes([self.get_object()], request)
+        if not representations:
+            raise Http404
+        return Response(representations[0])
+
     def get_serializer_class(self):
         """
         Method for serializer class.
@@ -105,6 +178,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         serializer.save(author=self.request.user)
 
+    def add_recipe(self, model, request, pk):
+        """
+        Method for adding a recipe to favorites or shopping cart.
+
+        Insert is idempotent, existing row is detected
+        by the unique constraint instead of a separate query.
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            with transaction.atomic():
+                model.objects.create(user=request.user, recipe=recipe)
+        except IntegrityError:
+            # Recipe is already added.
+            pass
+        serializer = RecipeListSerializer(recipe)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def remove_recipe(self, model, request, pk, message):
+        """
+        Method for removing a recipe from favorites or shopping cart.
+        """
+        deleted, _ = model.objects.filter(
+            user=request.user, recipe_id=pk
+        ).delete()
+        if not deleted:
+            raise Http404
+        return Response(message, status=status.HTTP_204_NO_CONTENT)
+
+    def change_recipes(self, model, request):
+        """
+        Method for adding or removing recipes in bulk.
+
+        Recipe ids are given in recipes list. Response reports ids
+        of changed recipes, unchanged ones and not found ones.
+        """
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
+        flags = dict(
+            Recipe.objects.filter(pk__in=recipe_ids)
+            .with_user_flags(request.user)
+            .values_list("pk", USER_RECIPE_FLAGS[model])
+        )
+        adding = request.method == "POST"
+        changed = [pk for pk in flags if flags[pk] != adding]
+        if changed:
+            changed = self.write_changes(
+                model, request.user, changed, adding
+            )
+        changed_key = "added" if adding else "removed"
+        results = {changed_key: [], "unchanged": [], "not_found": []}
+        changed = set(changed)
+        for pk in recipe_ids:
+            if pk not in flags:
+                results["not_found"].append(pk)
+            elif pk in changed:
+                results[changed_key].append(pk)
+            else:
+                results["unchanged"].append(pk)
+        return Response(results)
+
+    @transaction.atomic
+    def write_changes(self, model, user, recipe_ids, adding):
+        """
+        Method for inserting or deleting rows of recipes,
+        get ids of recipes whose rows were actually written.
+
+        Counters are changed only for these recipes, so concurrent
+        requests or stale flags can't make them drift.
+        """
+        if adding:
+            written = add_user_recipes(model, user, recipe_ids)
+        else:
+            written = remove_user_recipes(model, user, recipe_ids)
+        change_counter(
+            Recipe.objects.filter(pk__in=written),
+            RECIPE_COUNTERS[model],
+            1 if adding else -1,
+        )
+        return written
+
     @action(
         methods=["POST", "DELETE"],
         detail=True,
@@ -115,22 +269,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Method for adding or deleting recipe from favorited.
         """
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == "POST":
-            Favorite.objects.get_or_create(
-                user=self.request.user, recipe=recipe
-            )
-            serializer = RecipeListSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        favorite = get_object_or_404(
-            Favorite, user=self.request.user, recipe=recipe
+            return self.add_recipe(Favorite, request, pk)
+        return self.remove_recipe(
+            Favorite, request, pk, "status: Deleted from favorite."
         )
-        favorite.delete()
-        response = Response(
-            "status: Deleted from favorite.",
-            status=status.HTTP_204_NO_CONTENT,
-        )
-        return response
+
+    @action(
+        methods=["POST", "DELETE"],
+        detail=False,
+        url_path="favorite",
+        permission_classes=[Admin | AuthUser],
+    )
+    def post_delete_favorites(self, request):
+        """
+        Method for adding or deleting recipes from favorited in bulk.
+        """
+        return self.change_recipes(Favorite, request)
 
     @action(
         methods=["POST", "DELETE"],
@@ -142,38 +297,46 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Method for adding or deleting recipe from shopping cart.
         """
-        recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == "POST":
-            ShoppingCart.objects.get_or_create(
-                user=self.request.user, recipe=recipe
-            )
-            serializer = RecipeListSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        shopping_cart = get_object_or_404(
-            ShoppingCart, user=self.request.user, recipe=recipe
-        )
-        shopping_cart.delete()
-        response = Response(
-            "status: Deleted from shopping cart.",
-            status=status.HTTP_204_NO_CONTENT,
+            return self.add_recipe(ShoppingCart, request, pk)
+        return self.remove_recipe(
+            ShoppingCart, request, pk, "status: Deleted from shopping cart."
         )
-        return response
+
+    @action(
+        methods=["POST", "DELETE"],
+        detail=False,
+        url_path="shopping_cart",
+        permission_classes=[Admin | AuthUser],
+    )
+    def post_delete_shopping_carts(self, request):
+        """
+        Method for adding or deleting recipes from shopping cart in bulk.
+        """
+        return self.change_recipes(ShoppingCart, request)
 
     @action(
         methods=["GET"],
         detail=False,
         url_path="download_shopping_cart",
         permission_classes=[Admin | AuthUser],
+        renderer_classes=[
+            PlainTextRenderer,
+            PrintRenderer,
+            CSVRenderer,
+            JSONRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
         """
         Method for downloading a shopping list file.
+
+        File is streamed row by row, format is chosen with format
+        query parameter: txt (default), print, csv or json.
         """
-        if not request.user.shopping_cart.exists():
-            return Response(
-                "error: Shopping cart is empty.",
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        exporter_class = SHOPPING_LIST_EXPORTERS[
+            request.accepted_renderer.format
+        ]
 
         ingredient_list = (
             RecipeIngredient.objects.filter(
@@ -181,27 +344,104 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
             .values("ingredient__name", "ingredient__measurement_unit")
             .annotate(amount=Sum("amount"))
+            .order_by("ingredient__name")
+            .iterator(chunk_size=SHOPPING_LIST_CHUNK_SIZE)
         )
-
-        shopping_cart_list = []
-        shopping_cart_list.append("   Shopping list:")
-        for ingredient in ingredient_list:
-            shopping_cart_list.append(
-                (
-                    f'•  {ingredient.get("ingredient__name")} '
-                    f'({ingredient.get("ingredient__measurement_unit")}) '
-                    f'— {ingredient.get("amount")}'
-                )
+        first_ingredient = next(ingredient_list, None)
+        if first_ingredient is None:
+            return Response(
+                "error: Shopping cart is empty.",
+                status=status.HTTP_400_BAD_REQUEST,
             )
-        response = HttpResponse(
-            content="\n".join(shopping_cart_list),
-            content_type="text/plain; charset=UTF-8",
+
+        exporter = exporter_class()
+        response = StreamingHttpResponse(
+            exporter.stream(chain([first_ingredient], ingredient_list)),
+            content_type=exporter.content_type,
+        )
+        response["Content-Disposition"] = (
+            f"attachment; filename=shopping-list.{exporter.extension}"
         )
-        response[
-            "Content-Disposition"
-        ] = "attachment; filename=shopping-list.txt"
         return response
 
+    @action(methods=["GET"], detail=False, url_path="cookable")
+    def cookable(self, request):
+        """
+        Method for listing recipes cookable from given ingredients.
+
+        Ingredients are comma separated ids in ingredients query
+        parameter. Recipes missing fewer ingredients come first,
+        max_missing query parameter limits the number of missing ones.
+        Ranking is answered from in-memory index, only recipes of
+        the page are loaded from the database.
+        """
+        try:
+            ingredient_ids = {
+                int(ingredient_id)
+                for value in request.query_params.getlist("ingredients")
+                for ingredient_id in value.split(",")
+                if ingredient_id.strip()
+            }
+            max_missing = request.query_params.get("max_missing")
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                "error: Ingredients and max_missing must be integers.",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not ingredient_ids:
+            return Response(
+                "error: Ingredients are required.",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        ranked = cookable_index.search(ingredient_ids, max_missing)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(ranked, request, view=self)
+        recipes = self.get_queryset().in_bulk([pk for pk, _ in page])
+        cookable = []
+        for pk, missing_count in page:
+            if pk in recipes:
+                recipes[pk].missing_count = missing_count
+                cookable.append(recipes[pk])
+        serializer = CookableRecipeSerializer(
+            cookable, many=True, context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        url_path="feed",
+        permission_classes=[Admin | AuthUser],
+    )
+    def feed(self, request):
+        """
+        Method for listing recipes of followed authors, newest first.
+
+        Page of recipe ids is read from precomputed feed entries
+        of the user, only recipes of the page are loaded.
+        """
+        paginator = FeedCursorPagination()
+        entries = FeedEntry.objects.filter(user=request.user).only(
+            "recipe_id", "pub_date"
+        )
+        page = paginator.paginate_queryset(entries, request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in page]
+        )
+        return paginator.get_paginated_response(
+            represent_recipes(
+                [
+                    recipes[entry.recipe_id]
+                    for entry in page
+                    if entry.recipe_id in recipes
+                ],
+                request,
+            )
+        )
+
 
 class CustomUserViewSet(UserViewSet):
     """
@@ -227,19 +467,46 @@ class CustomUserViewSet(UserViewSet):
         """
         Method for get user subscriptions.
         """
-        queryset = User.objects.filter(author__user=request.user)
-        if not queryset.exists():
+        try:
+            recipes_limit = self.get_recipes_limit()
+        except ValueError:
             return Response(
-                "status: You don't have subscriptions.",
+                "error: recipes_limit must be a non-negative integer.",
                 status=status.HTTP_400_BAD_REQUEST,
             )
+        queryset = User.objects.filter(author__user=request.user)
         pages = self.paginate_queryset(queryset)
+        self.prefetch_recipes(pages, recipes_limit)
         serializer = UserSubscriptionSerializer(
             pages, many=True, context={"request": request}
         )
         response = self.get_paginated_response(serializer.data)
         return response
 
+    def get_recipes_limit(self):
+        """
+        Method for getting recipes_limit query parameter.
+
+        Raises ValueError unless it is a non-negative integer.
+        """
+        recipes_limit = self.request.query_params.get("recipes_limit")
+        if recipes_limit is None:
+            return None
+        recipes_limit = int(recipes_limit)
+        if recipes_limit < 0:
+            raise ValueError(recipes_limit)
+        return recipes_limit
+
+    def prefetch_recipes(self, authors, recipes_limit=None):
+        """
+        Method for prefetching authors recipes in one query,
+        at most recipes_limit latest recipes per author if given.
+        """
+        recipes = Recipe.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.latest_per_author(recipes_limit)
+        prefetch_related_objects(authors, Prefetch("recipes", recipes))
+
     @action(
         methods=["POST", "DELETE"],
         detail=False,
@@ -253,8 +520,18 @@ class CustomUserViewSet(UserViewSet):
         user = get_object_or_404(User, username=request.user)
         author = get_object_or_404(User, pk=pk)
         if self.request.method == "POST":
+            try:
+                recipes_limit = self.get_recipes_limit()
+            except ValueError:
+                return Response(
+                    "error: recipes_limit must be a non-negative integer.",
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
             Subscription.objects.get_or_create(user=user, author=author)
-            serializer = UserSubscriptionSerializer(author)
+            self.prefetch_recipes([author], recipes_limit)
+            serializer = UserSubscriptionSerializer(
+                author, context={"request": request}
+            )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         subscription = get_object_or_404(
             Subscription, user=user, author=author
@@ -265,3 +542,74 @@ class CustomUserViewSet(UserViewSet):
             status=status.HTTP_204_NO_CONTENT,
         )
         return response
+
+
+class UploadViewSet(viewsets.ViewSet):
+    """
+    Viewset for chunked and resumable image uploads.
+
+    Authorized users start an upload with its size or a multipart file,
+    send chunks with Upload-Offset header, check received offset
+    to resume, and reference completed upload in recipe image
+    as "upload:<token>".
+    """
+
+    permission_classes = [Admin | AuthUser]
+    parser_classes = [JSONParser, MultiPartParser]
+
+    def create(self, request):
+        """
+        Method for starting an upload.
+        """
+        file = request.FILES.get("file")
+        size = file.size if file else request.data.get("size")
+        try:
+            token = start_upload(request.user, int(size))
+            offset = 0
+            if file:
+                offset = append_chunk(request.user, token, 0, file)
+        except (TypeError, ValueError, UploadError) as error:
+            return Response(
+                f"error: {error}", status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(
+            {"token": token, "offset": offset, "size": int(size)},
+            status=status.HTTP_201_CREATED,
+        )
+
+    def retrieve(self, request, pk):
+        """
+        Method for getting received offset of an upload.
+        """
+        try:
+            path = upload_path(request.user, pk)
+        except UploadError:
+            raise Http404
+        offset = get_offset(path)
+        if offset is None:
+            raise Http404
+        return Response({"token": pk, "offset": offset})
+
+    def partial_update(self, request, pk):
+        """
+        Method for appending a chunk to an upload.
+        """
+        try:
+            offset = int(request.headers["Upload-Offset"])
+        except (KeyError, ValueError):
+            return Response(
+                "error: Upload-Offset header must be an integer.",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if request.stream is None:
+            return Response(
+                "error: Chunk must not be empty.",
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            offset = append_chunk(request.user, pk, offset, request.stream)
+        except UploadError as error:
+            return Response(
+                f"error: {error}", status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({"token": pk, "offset": offset})
@@ -0,0 +1,68 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+read_replica = ContextVar("read_replica", default=None)
+
+
+class PrimaryReplicaRouter:
+    """
+    Router sending writes to the primary database
+    and reads of safe requests to the replica chosen for the request.
+
+    Reads go to replicas only inside ReplicaMiddleware,
+    so management commands, shell and writing requests
+    always read their own writes from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_replica.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.REPLICA_DATABASES}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Middleware reading from a replica during safe requests.
+
+    One random replica serves all reads of a request, so they see
+    the same state however much replicas lag behind each other.
+    Unsafe requests set PRIMARY_PIN_COOKIE for PRIMARY_PIN_SECONDS.
+    Requests sending it back read from the primary,
+    so the client sees its own writes despite replication lag.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.REPLICA_DATABASES:
+            return self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            response = self.get_response(request)
+            response.set_cookie(
+                settings.PRIMARY_PIN_COOKIE,
+                "1",
+                max_age=settings.PRIMARY_PIN_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+            return response
+        if settings.PRIMARY_PIN_COOKIE in request.COOKIES:
+            return self.get_response(request)
+        token = read_replica.set(random.choice(settings.REPLICA_DATABASES))
+        try:
+            return self.get_response(request)
+        finally:
+            read_replica.reset(token)
@@ -30,6 +30,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.telemetry.TelemetryMiddleware",
+    "foodgram.routers.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,6 +81,52 @@ else:
         }
     }
 
+# Comma-separated read replicas of the database:
+# SQLite files in debug mode, PostgreSQL hosts with optional port otherwise.
+DB_REPLICAS = [
+    replica for replica in os.getenv("DB_REPLICAS", "").split(",") if replica
+]
+REPLICA_DATABASES = []
+for number, replica in enumerate(DB_REPLICAS, 1):
+    if DEBUG:
+        location = {"NAME": replica}
+    else:
+        host, _, port = replica.partition(":")
+        location = {"HOST": host, "PORT": port or DATABASES["default"]["PORT"]}
+    DATABASES[f"replica_{number}"] = {
+        **DATABASES["default"],
+        **location,
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["foodgram.routers.PrimaryReplicaRouter"]
+PRIMARY_PIN_COOKIE = "use_primary"
+PRIMARY_PIN_SECONDS = int(os.getenv("PRIMARY_PIN_SECONDS", 10))
+
+# Default cache keeps versions of cached data (api/versions.py).
+# With more than one worker it must be shared, like Redis or memcached:
+# process-local cache lets every worker see only its own changes,
+# so its versions expire after VERSION_TTL seconds to bound staleness.
+LOCMEM_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", LOCMEM_CACHE)
+VERSION_TTL = 60 if CACHE_BACKEND == LOCMEM_CACHE else None
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    },
+    "recipes": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", "recipes"),
+        "KEY_PREFIX": "recipes",
+        "TIMEOUT": 24 * 60 * 60,
+    },
+}
+if CACHE_BACKEND == LOCMEM_CACHE:
+    CACHES["recipes"]["OPTIONS"] = {"MAX_ENTRIES": 10000}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -114,6 +162,12 @@ STATIC_ROOT = BASE_DIR / "collected_static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+RECIPE_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 40_000_000
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", BASE_DIR / "uploads")
+UPLOAD_EXPIRE = 24 * 60 * 60
+
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 
@@ -122,12 +176,31 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticatedOrReadOnly",
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework.authentication.TokenAuthentication",
+        "api.authentication.CachedTokenAuthentication",
     ),
     "DEFAULT_PAGINATION_CLASS": "api.pagination.CustomPagination",
     "PAGE_SIZE": 6,
 }
 
+COOKABLE_INDEX_TTL = 5 * 60
+# Must be longer than COOKABLE_INDEX_TTL.
+COOKABLE_CHANGES_TTL = 2 * COOKABLE_INDEX_TTL
+CATALOGUE_CACHE_SIZE = 256
+FEED_LENGTH = 1000
+RECIPE_FRAGMENT_CACHE = "recipes"
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TTL = 60
+# Alias of a cache shared between processes for authenticated tokens.
+# Without it tokens are cached in every process, up to TOKEN_CACHE_SIZE,
+# and revoked ones are accepted by other processes for TOKEN_CACHE_TTL.
+TOKEN_CACHE = os.getenv("TOKEN_CACHE") or None
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "") == "1"
+# Comma-separated networks allowed to scrape /metrics.
+METRICS_ALLOWED_NETWORKS = os.getenv(
+    "METRICS_ALLOWED_NETWORKS", "127.0.0.1/32,::1/128"
+).split(",")
+
 DJOSER = {
     "LOGIN_FIELD": "email",
     "SERIALIZERS": {
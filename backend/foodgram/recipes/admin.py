@@ -1,4 +1,8 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F
+from django.utils.functional import cached_property
 from recipes.models import (
     Favorite,
     Ingredient,
@@ -9,32 +13,108 @@ from recipes.models import (
 )
 from users.models import Subscription, User
 
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for large tables.
+
+    Unfiltered changelists on PostgreSQL take count from table
+    statistics instead of running full COUNT(*).
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if not queryset.query.where and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE relname = %s",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] > ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class InputFilter(admin.SimpleListFilter):
+    """
+    List filter with text input instead of enumerated choices.
+    """
+
+    template = "admin/input_filter.html"
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Filter is displayed only when it has lookups.
+        return ((None, None),)
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        all_choice["query_parts"] = (
+            (key, value)
+            for key, value in changelist.get_filters_params().items()
+            if key != self.parameter_name
+        )
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.lookup: self.value().strip()})
+        return queryset
+
+
+class UserFilter(InputFilter):
+    title = "username"
+    parameter_name = "user"
+    lookup = "user__username"
+
+
+class AuthorFilter(InputFilter):
+    title = "author username"
+    parameter_name = "author"
+    lookup = "author__username"
+
+
+class RecipeNameFilter(InputFilter):
+    title = "recipe name"
+    parameter_name = "name"
+    lookup = "name__istartswith"
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
 
 class RecipeIngredientInLine(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ("ingredient",)
 
 
 @admin.register(User)
-class User(admin.ModelAdmin):
+class User(LargeTableAdmin):
     list_display = (
         "username",
         "email",
+        "recipes_count",
     )
-    search_fields = ("username",)
-    list_filter = ("username", "email")
+    search_fields = ("username", "email")
 
 
 @admin.register(Subscription)
-class Subscription(admin.ModelAdmin):
+class Subscription(LargeTableAdmin):
     list_display = (
         "user",
         "author",
     )
-    search_fields = (
-        "user",
-        "author",
-    )
+    list_select_related = ("user", "author")
+    list_filter = (UserFilter, AuthorFilter)
+    autocomplete_fields = ("user", "author")
 
 
 @admin.register(Tag)
@@ -44,30 +124,38 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
-    def favorite(self, obj):
-        return obj.favorite.count()
-
-    list_display = ("name", "author", "favorite")
+class RecipeAdmin(LargeTableAdmin):
+    list_display = ("name", "author", "favorites_count", "shopping_cart_count")
+    list_select_related = ("author",)
     inlines = (RecipeIngredientInLine,)
-    list_filter = ("name", "author", "tags")
+    list_filter = (RecipeNameFilter, AuthorFilter, "tags")
     search_fields = ("name",)
+    autocomplete_fields = ("author",)
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            obj.version = F("version") + 1
+        super().save_model(request, obj, form, change)
+        obj.refresh_from_db(fields=["version"])
 
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ("name", "measurement_unit")
-    list_filter = ("name",)
     search_fields = ("name",)
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     list_display = ("user", "recipe")
-    list_filter = ("user",)
+    list_select_related = ("user", "recipe")
+    list_filter = (UserFilter,)
+    autocomplete_fields = ("user", "recipe")
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     list_display = ("user", "recipe")
-    list_filter = ("user",)
+    list_select_related = ("user", "recipe")
+    list_filter = (UserFilter,)
+    autocomplete_fields = ("user", "recipe")
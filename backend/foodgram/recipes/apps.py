@@ -1,7 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
     verbose_name = 'Recipes'
+
+    def ready(self):
+        import recipes.signals  # noqa: F401
+        from recipes.search import create_sqlite_search
+
+        post_migrate.connect(create_sqlite_search, sender=self)
@@ -0,0 +1,123 @@
+from django.db import connections, router
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import User
+
+RECIPE_COUNTERS = {
+    Favorite: "favorites_count",
+    ShoppingCart: "shopping_cart_count",
+}
+
+
+def change_counter(queryset, field, delta):
+    """
+    Atomically change counter field of queryset rows by delta.
+    """
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def add_user_recipes(model, user, recipe_ids):
+    """
+    Insert rows of model for user and recipes not added yet
+    and get ids of recipes actually added.
+
+    Conflicting rows are skipped by the database and RETURNING
+    reports inserted rows only, so concurrent requests adding
+    the same recipes never count them twice.
+    """
+    if not recipe_ids:
+        return []
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    user_column = quote(model._meta.get_field("user").column)
+    recipe_column = quote(model._meta.get_field("recipe").column)
+    values = ", ".join(["(%s, %s)"] * len(recipe_ids))
+    params = [value for pk in recipe_ids for value in (user.pk, pk)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({user_column}, {recipe_column}) "
+            f"VALUES {values} ON CONFLICT DO NOTHING "
+            f"RETURNING {recipe_column}",
+            params,
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def remove_user_recipes(model, user, recipe_ids):
+    """
+    Delete rows of model for user and recipes
+    and get ids of recipes actually removed.
+
+    Rows are deleted in one statement without post_delete signals
+    and RETURNING reports deleted rows only, so concurrent requests
+    removing the same recipes never count them twice.
+    """
+    if not recipe_ids:
+        return []
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    user_column = quote(model._meta.get_field("user").column)
+    recipe_column = quote(model._meta.get_field("recipe").column)
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {user_column} = %s "
+            f"AND {recipe_column} IN ({placeholders}) "
+            f"RETURNING {recipe_column}",
+            [user.pk, *recipe_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def count_of(model, field):
+    """
+    Subquery counting model rows related by field to outer row.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        Value(0),
+    )
+
+
+def recount_recipes(recipes=None):
+    """
+    Recount drifted favorites and shopping cart counters of recipes.
+    """
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    drifted = recipes.annotate(
+        actual_favorites_count=count_of(Favorite, "recipe"),
+        actual_shopping_cart_count=count_of(ShoppingCart, "recipe"),
+    ).exclude(
+        favorites_count=F("actual_favorites_count"),
+        shopping_cart_count=F("actual_shopping_cart_count"),
+    )
+    return Recipe.objects.filter(pk__in=drifted.values("pk")).update(
+        favorites_count=count_of(Favorite, "recipe"),
+        shopping_cart_count=count_of(ShoppingCart, "recipe"),
+    )
+
+
+def recount_users(users=None):
+    """
+    Recount drifted recipes counter of users.
+    """
+    if users is None:
+        users = User.objects.all()
+    drifted = users.annotate(
+        actual_recipes_count=count_of(Recipe, "author")
+    ).exclude(recipes_count=F("actual_recipes_count"))
+    return User.objects.filter(pk__in=drifted.values("pk")).update(
+        recipes_count=count_of(Recipe, "author")
+    )
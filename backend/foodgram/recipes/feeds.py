@@ -0,0 +1,154 @@
+from heapq import merge
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription
+
+BATCH_SIZE = 1000
+
+
+def fan_out(recipe):
+    """
+    Add new recipe to feeds of all followers of its author
+    and trim these feeds to their length.
+
+    Followers are handled in batches, every batch in its own
+    transaction with one insert and one windowed delete.
+    """
+    followers = list(
+        Subscription.objects.filter(author=recipe.author_id).values_list(
+            "user_id", flat=True
+        )
+    )
+    for start in range(0, len(followers), BATCH_SIZE):
+        users = followers[start : start + BATCH_SIZE]
+        with transaction.atomic():
+            FeedEntry.objects.bulk_create(
+                (
+                    FeedEntry(
+                        user_id=user, recipe=recipe, pub_date=recipe.pub_date
+                    )
+                    for user in users
+                ),
+                ignore_conflicts=True,
+            )
+            trim_user_feeds(users)
+
+
+def follow(user, author):
+    """
+    Add the latest recipes of followed author to user's feed
+    and trim the feed to its length.
+    """
+    recipes = Recipe.objects.filter(author=author).order_by("-pub_date")[
+        : settings.FEED_LENGTH
+    ]
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(user_id=user, recipe_id=recipe, pub_date=pub_date)
+            for recipe, pub_date in recipes.values_list("pk", "pub_date")
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    trim_user_feeds([user])
+
+
+def unfollow(user, author):
+    """
+    Remove recipes of unfollowed author from user's feed.
+    """
+    FeedEntry.objects.filter(
+        user=user,
+        recipe__in=Recipe.objects.filter(author=author).values("pk"),
+    ).delete()
+
+
+def trim_user_feeds(users):
+    """
+    Remove entries beyond FEED_LENGTH newest ones from feeds of users,
+    get number of removed entries.
+    """
+    if not users:
+        return 0
+    connection = connections[router.db_for_write(FeedEntry)]
+    quote = connection.ops.quote_name
+    table = quote(FeedEntry._meta.db_table)
+    pk, user, recipe, pub_date = (
+        quote(FeedEntry._meta.get_field(name).column)
+        for name in ("id", "user", "recipe", "pub_date")
+    )
+    placeholders = ", ".join(["%s"] * len(users))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {pk} IN ("
+            f"SELECT {pk} FROM ("
+            f"SELECT {pk}, ROW_NUMBER() OVER ("
+            f"PARTITION BY {user} ORDER BY {pub_date} DESC, {recipe} DESC"
+            f") AS position FROM {table} WHERE {user} IN ({placeholders})"
+            f") AS ranked WHERE position > %s)",
+            [*users, settings.FEED_LENGTH],
+        )
+        return cursor.rowcount
+
+
+def trim_feeds():
+    """
+    Trim feeds longer than FEED_LENGTH, get number of removed entries.
+    """
+    users = list(
+        FeedEntry.objects.values("user")
+        .annotate(count=Count("pk"))
+        .filter(count__gt=settings.FEED_LENGTH)
+        .values_list("user", flat=True)
+    )
+    return sum(
+        trim_user_feeds(users[start : start + BATCH_SIZE])
+        for start in range(0, len(users), BATCH_SIZE)
+    )
+
+
+def rebuild_feeds(users):
+    """
+    Fill feeds of users from their subscriptions.
+
+    Latest recipes of every followed author are loaded once
+    and merged per user, feeds are written in batches.
+    """
+    FeedEntry.objects.filter(user__in=users).delete()
+    authors = {}
+    for user, author in (
+        Subscription.objects.filter(user__in=users, author__isnull=False)
+        .values_list("user", "author")
+        .iterator()
+    ):
+        authors.setdefault(user, []).append(author)
+    recipes = {}
+    for author, recipe, pub_date in (
+        Recipe.objects.filter(
+            author__in={author for ids in authors.values() for author in ids}
+        )
+        .order_by("-pub_date", "-id")
+        .values_list("author", "pk", "pub_date")
+        .iterator()
+    ):
+        latest = recipes.setdefault(author, [])
+        if len(latest) < settings.FEED_LENGTH:
+            latest.append((pub_date, recipe))
+    entries = (
+        FeedEntry(user_id=user, recipe_id=recipe, pub_date=pub_date)
+        for user, followed in authors.items()
+        for pub_date, recipe in islice(
+            merge(
+                *(recipes.get(author, ()) for author in followed),
+                reverse=True,
+            ),
+            settings.FEED_LENGTH,
+        )
+    )
+    FeedEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:30
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(
+        models.Subquery(
+            model.objects.filter(**{field: models.OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(count=models.Count("pk"))
+            .values("count")
+        ),
+        models.Value(0),
+    )
+
+
+def fill_counters(apps, schema_editor):
+    """
+    Fill counters for existing recipes and users.
+    """
+    Recipe = apps.get_model("recipes", "Recipe")
+    Favorite = apps.get_model("recipes", "Favorite")
+    ShoppingCart = apps.get_model("recipes", "ShoppingCart")
+    User = apps.get_model("users", "User")
+    Recipe.objects.update(
+        favorites_count=count_of(Favorite, "recipe"),
+        shopping_cart_count=count_of(ShoppingCart, "recipe"),
+    )
+    User.objects.update(recipes_count=count_of(Recipe, "author"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_lookup_indexes'),
+        ('users', '0007_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.3 on 2026-10-18 12:10
+
+from django.db import migrations
+
+# Search vector is generated by the database on every save,
+# name has higher weight than text.
+POSTGRESQL_FORWARD = (
+    """
+    ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    ) STORED
+    """,
+    """
+    CREATE INDEX recipe_search_vector_idx
+    ON recipes_recipe USING gin (search_vector)
+    """,
+)
+POSTGRESQL_BACKWARD = (
+    "DROP INDEX IF EXISTS recipe_search_vector_idx",
+    "ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector",
+)
+
+
+def run_statements(schema_editor, statements):
+    # SQLite search table is created by post_migrate handler.
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search(apps, schema_editor):
+    run_statements(schema_editor, POSTGRESQL_FORWARD)
+
+
+def drop_search(apps, schema_editor):
+    run_statements(schema_editor, POSTGRESQL_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0012_recipe_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
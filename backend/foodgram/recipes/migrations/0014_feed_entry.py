@@ -0,0 +1,72 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:46
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Length of feeds when this migration was written,
+# independent of FEED_LENGTH setting changed later.
+FEED_LENGTH = 1000
+
+
+def fill_feeds(apps, schema_editor):
+    """
+    Fill feeds of subscribers with latest recipes of their authors.
+    """
+    FeedEntry = apps.get_model("recipes", "FeedEntry")
+    Recipe = apps.get_model("recipes", "Recipe")
+    Subscription = apps.get_model("users", "Subscription")
+    authors = {}
+    subscriptions = Subscription.objects.filter(
+        author__isnull=False
+    ).values_list("user_id", "author_id")
+    for user_id, author_id in subscriptions.iterator():
+        authors.setdefault(user_id, []).append(author_id)
+    for user_id, author_ids in authors.items():
+        recipes = (
+            Recipe.objects.filter(author_id__in=author_ids)
+            .order_by("-pub_date", "-id")
+            .values_list("pk", "pub_date")[:FEED_LENGTH]
+        )
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user_id, recipe_id=pk, pub_date=pub_date)
+                for pk, pub_date in recipes
+            ],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0013_recipe_search'),
+        ('users', '0007_user_recipes_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Publication date')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Feed entry',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_entry_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 10:53
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='recipeingredient',
+            options={'ordering': ('id',), 'verbose_name': 'Recipe ingredients'},
+        ),
+    ]
@@ -1,18 +1,30 @@
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import connections
 from django.db.models import (
     CASCADE,
+    DO_NOTHING,
+    BooleanField,
     CharField,
     DateTimeField,
+    Exists,
     ForeignKey,
     ImageField,
+    Index,
     ManyToManyField,
     Model,
+    OneToOneField,
+    OuterRef,
     PositiveIntegerField,
+    QuerySet,
     SlugField,
+    Subquery,
     TextField,
     UniqueConstraint,
+    Value,
 )
+from recipes.search import FTS_TABLE, SearchDocumentField, search_recipes
+from recipes.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -59,6 +71,57 @@ class Ingredient(Model):
         )
 
 
+class RecipeQuerySet(QuerySet):
+    """
+    Queryset for recipes.
+    """
+
+    def with_user_flags(self, user):
+        """
+        Annotate recipes with is_favorited and is_in_shopping_cart
+        flags for given user.
+
+        Anonymous users get constant False without any subqueries.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+        )
+
+    def latest_per_author(self, limit):
+        """
+        Keep only given number of the most recent recipes of every author.
+
+        Limit is applied in the database by a correlated subquery,
+        so recipes of many authors can be fetched in one query.
+        """
+        latest = self.model.objects.filter(author=OuterRef("author")).order_by(
+            "-pub_date"
+        )
+        return self.filter(pk__in=Subquery(latest.values("pk")[:limit]))
+
+    def search(self, term):
+        """
+        Keep recipes matching search term and order them by rank.
+
+        PostgreSQL uses generated tsvector column with GIN index,
+        SQLite uses FTS5 table.
+        """
+        recipes = search_recipes(self, connections[self.db].vendor, term)
+        if recipes is None:
+            return self.none()
+        return recipes.order_by("-search_rank", "-pub_date", "-id")
+
+
 class Recipe(Model):
     """
     Recipe model based on abstract model.
@@ -67,6 +130,10 @@ class Recipe(Model):
     Users can create and edit recipes, browse other authors recipes.
 
     All fields are required. Author and publication date added automatically.
+    Favorites and shopping cart counters are maintained by signals.
+    Version is increased on every change of recipe or its author
+    to invalidate cached representations.
+    Images are stored by content hash and shared by identical uploads.
     """
 
     tags = ManyToManyField(Tag)
@@ -75,35 +142,99 @@ class Recipe(Model):
         validators=[MaxValueValidator(2880), MinValueValidator(1)]
     )
     text = TextField()
-    author = ForeignKey(User, on_delete=CASCADE, related_name="recipes")
+    author = ForeignKey(
+        User, on_delete=CASCADE, related_name="recipes", db_index=False
+    )
     ingredients = ManyToManyField(
         "Ingredient",
         through="RecipeIngredient",
         through_fields=("recipe", "ingredient"),
         related_name="recipes",
     )
-    image = ImageField(upload_to="recipes/images/", null=True, default=None)
+    image = ImageField(
+        upload_to="recipes/images/",
+        storage=ContentAddressedStorage(),
+        null=True,
+        default=None,
+    )
     pub_date = DateTimeField("Publication date", auto_now_add=True)
+    favorites_count = PositiveIntegerField(default=0, editable=False)
+    shopping_cart_count = PositiveIntegerField(default=0, editable=False)
+    version = PositiveIntegerField(default=1, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Recipe"
         ordering = ("-pub_date",)
+        indexes = [
+            Index(fields=["-pub_date", "-id"], name="recipe_pub_date_idx"),
+            Index(fields=["author", "-pub_date"], name="recipe_author_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RecipeIngredientsChange(Model):
+    """
+    Recipe ingredients change model based on abstract model.
+
+    It represents a change of ingredients of a recipe, so that other
+    processes refresh only changed recipes of the cookable index.
+    Rows older than COOKABLE_CHANGES_TTL are deleted on new changes.
+    """
+
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    changed_at = DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Recipe ingredients change"
+
+
+class RecipeSearchIndex(Model):
+    """
+    Full-text index of recipes in SQLite, used by recipe search.
+
+    Maps FTS5 table created by create_sqlite_search,
+    so the table is joined to recipes by the ORM.
+    Not available on PostgreSQL, which searches recipes table itself.
+    """
+
+    recipe = OneToOneField(
+        Recipe,
+        on_delete=DO_NOTHING,
+        primary_key=True,
+        db_column="rowid",
+        db_constraint=False,
+        related_name="search_index",
+    )
+    document = SearchDocumentField(db_column=FTS_TABLE)
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
+
+
 class RecipeIngredient(Model):
     """
     Related model between recipe and ingredient based on abstract model.
 
     Needed for correct addition of ingredients amount to recipe.
 
-    All fields are required.
+    All fields are required. Ingredients keep the order they were added in.
     """
 
     recipe = ForeignKey(
-        Recipe, on_delete=CASCADE, related_name="recipe_ingredient"
+        Recipe,
+        on_delete=CASCADE,
+        related_name="recipe_ingredient",
+        db_index=False,
     )
     ingredient = ForeignKey(
         Ingredient, on_delete=CASCADE, related_name="recipe_ingredient"
@@ -114,6 +245,13 @@ class RecipeIngredient(Model):
 
     class Meta:
         verbose_name = "Recipe ingredients"
+        ordering = ("id",)
+        constraints = [
+            UniqueConstraint(
+                fields=["recipe", "ingredient"],
+                name="unique_recipe_ingredient",
+            )
+        ]
 
 
 class Favorite(Model):
@@ -125,8 +263,12 @@ class Favorite(Model):
     All fields are required.
     """
 
-    user = ForeignKey(User, on_delete=CASCADE, related_name="favorite")
-    recipe = ForeignKey(Recipe, on_delete=CASCADE, related_name="favorite")
+    user = ForeignKey(
+        User, on_delete=CASCADE, related_name="favorite", db_index=False
+    )
+    recipe = ForeignKey(
+        Recipe, on_delete=CASCADE, related_name="favorite", db_index=False
+    )
 
     class Meta:
         verbose_name = "Favorite recipes"
@@ -136,6 +278,9 @@ class Favorite(Model):
                 name="unique_user_favorite",
             )
         ]
+        indexes = [
+            Index(fields=["user", "recipe"], name="favorite_user_idx"),
+        ]
 
 
 class ShoppingCart(Model):
@@ -148,9 +293,11 @@ class ShoppingCart(Model):
     All fields are required.
     """
 
-    user = ForeignKey(User, on_delete=CASCADE, related_name="shopping_cart")
+    user = ForeignKey(
+        User, on_delete=CASCADE, related_name="shopping_cart", db_index=False
+    )
     recipe = ForeignKey(
-        Recipe, on_delete=CASCADE, related_name="shopping_cart"
+        Recipe, on_delete=CASCADE, related_name="shopping_cart", db_index=False
     )
 
     class Meta:
@@ -161,3 +308,40 @@ class ShoppingCart(Model):
                 name="unique_user_shopping_cart",
             )
         ]
+        indexes = [
+            Index(fields=["user", "recipe"], name="shopping_cart_user_idx"),
+        ]
+
+
+class FeedEntry(Model):
+    """
+    Feed entry model based on abstract model.
+
+    It represents a recipe in the feed of a follower of its author.
+    Entries are written when recipe is created or author is followed,
+    so a page of the feed is read from one index range.
+
+    Publication date is copied from the recipe for ordering.
+    """
+
+    user = ForeignKey(
+        User, on_delete=CASCADE, related_name="feed", db_index=False
+    )
+    recipe = ForeignKey(
+        Recipe, on_delete=CASCADE, related_name="feed_entries"
+    )
+    pub_date = DateTimeField("Publication date")
+
+    class Meta:
+        verbose_name = "Feed entry"
+        constraints = [
+            UniqueConstraint(
+                fields=["user", "recipe"], name="unique_feed_entry"
+            )
+        ]
+        indexes = [
+            Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="feed_entry_user_idx",
+            ),
+        ]
@@ -0,0 +1,163 @@
+import re
+
+from django.db.models import (
+    BooleanField,
+    F,
+    FloatField,
+    Func,
+    Lookup,
+    Q,
+    TextField,
+    Value,
+)
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = "russian"
+RECIPE_TABLE = "recipes_recipe"
+FTS_TABLE = "recipes_recipe_fts"
+# Weights of name and text columns for SQLite ranking.
+FTS_WEIGHTS = (10.0, 1.0)
+
+# SQLite fallback for DEBUG mode. Created after migrations,
+# because SQLite drops triggers when Django remakes recipes table.
+SQLITE_STATEMENTS = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, text,
+        content='{RECIPE_TABLE}', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON {RECIPE_TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, text)
+        VALUES ('delete', old.id, old.name, old.text);
+        INSERT INTO {FTS_TABLE} (rowid, name, text)
+        VALUES (new.id, new.name, new.text);
+    END
+    """,
+)
+SQLITE_TRIGGERS = 3
+
+
+class SearchDocumentField(TextField):
+    """
+    Hidden column of FTS5 table named as the table itself.
+
+    Matching it searches all columns and it is the first
+    argument of FTS5 ranking functions.
+    """
+
+
+@SearchDocumentField.register_lookup
+class Match(Lookup):
+    lookup_name = "match"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", lhs_params + rhs_params
+
+
+class BM25(Func):
+    function = "bm25"
+    output_field = FloatField()
+
+
+def create_sqlite_search(using, **kwargs):
+    """
+    Create FTS5 table with triggers when they are missing
+    and rebuild the index from recipes table.
+    """
+    from django.db import connections
+
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE %s",
+            [f"{FTS_TABLE}_%"],
+        )
+        if cursor.fetchone()[0] == SQLITE_TRIGGERS:
+            return
+        for statement in SQLITE_STATEMENTS:
+            cursor.execute(statement)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def get_words(term):
+    return re.findall(r"\w+", term)
+
+
+def postgresql_search(queryset, words):
+    query = " & ".join(words) + ":*"
+    tsquery = "to_tsquery(%s::regconfig, %s)"
+    match = RawSQL(
+        f'"{RECIPE_TABLE}"."search_vector" @@ {tsquery}',
+        [SEARCH_CONFIG, query],
+        output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f'ts_rank("{RECIPE_TABLE}"."search_vector", {tsquery})',
+        [SEARCH_CONFIG, query],
+        output_field=FloatField(),
+    )
+    return queryset.filter(match).annotate(search_rank=rank)
+
+
+def sqlite_search(queryset, words):
+    # FTS5 table is joined, so the full-text query runs once
+    # and bm25 is computed only for matching rows.
+    query = " ".join(f'"{word}"' for word in words) + "*"
+    document = F("search_index__document")
+    return queryset.filter(search_index__document__match=query).annotate(
+        # bm25 is lower for better matches.
+        search_rank=-BM25(document, *map(Value, FTS_WEIGHTS))
+    )
+
+
+def fallback_search(queryset, words):
+    match = Q()
+    for word in words:
+        match &= Q(name__icontains=word) | Q(text__icontains=word)
+    return queryset.filter(match).annotate(
+        search_rank=Value(0.0, output_field=FloatField())
+    )
+
+
+SEARCH_BACKENDS = {
+    "postgresql": postgresql_search,
+    "sqlite": sqlite_search,
+}
+
+
+def search_recipes(queryset, vendor, term):
+    """
+    Get recipes matching search term annotated with search_rank,
+    or None when term has no words.
+
+    Words are combined with AND, the last word is matched as prefix.
+    """
+    words = get_words(term)
+    if not words:
+        return None
+    return SEARCH_BACKENDS.get(vendor, fallback_search)(queryset, words)
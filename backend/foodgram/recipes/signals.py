@@ -0,0 +1,111 @@
+import logging
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from recipes.counters import RECIPE_COUNTERS, change_counter
+from recipes.feeds import fan_out, follow, unfollow
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.variants import generate_variants
+from users.models import Subscription, User
+
+AUTHOR_FIELDS = {"email", "username", "first_name", "last_name"}
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            Recipe.objects.filter(pk=instance.recipe_id),
+            RECIPE_COUNTERS[sender],
+            1,
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    change_counter(
+        Recipe.objects.filter(pk=instance.recipe_id),
+        RECIPE_COUNTERS[sender],
+        -1,
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(
+            User.objects.filter(pk=instance.author_id), "recipes_count", 1
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    change_counter(
+        User.objects.filter(pk=instance.author_id), "recipes_count", -1
+    )
+
+
+@receiver(post_save, sender=User)
+def change_recipes_version(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    change_counter(Recipe.objects.filter(author=instance), "version", 1)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def change_catalogue_recipes_version(sender, instance, created, **kwargs):
+    if not created:
+        increase_recipes_version(sender, instance)
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def change_deleted_catalogue_recipes_version(sender, instance, **kwargs):
+    increase_recipes_version(sender, instance)
+
+
+def increase_recipes_version(sender, instance):
+    """
+    Increase version of recipes using changed tag or ingredient.
+    """
+    lookup = "tags" if sender is Tag else "ingredients"
+    change_counter(
+        Recipe.objects.filter(**{lookup: instance}), "version", 1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def create_image_variants(sender, instance, update_fields, **kwargs):
+    if instance.image and (update_fields is None or "image" in update_fields):
+        # Missing or unreadable original must not fail saving the recipe.
+        try:
+            generate_variants(instance.image.storage, instance.image.name)
+        except OSError:
+            logger.exception(
+                "Variants of image %s are not generated.", instance.image.name
+            )
+
+
+@receiver(post_save, sender=Recipe)
+def add_to_feeds(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(partial(fan_out, instance))
+
+
+@receiver(post_save, sender=Subscription)
+def fill_feed(sender, instance, created, **kwargs):
+    if created and instance.author_id is not None:
+        follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def clear_feed(sender, instance, **kwargs):
+    if instance.author_id is not None:
+        unfollow(instance.user_id, instance.author_id)
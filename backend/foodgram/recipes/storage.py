@@ -0,0 +1,106 @@
+import hashlib
+import os
+import posixpath
+import re
+import secrets
+
+from django.core.files.storage import FileSystemStorage
+
+HASH_CHUNK_SIZE = 64 * 1024
+HASHED_NAME = re.compile(r"(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$")
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    File system storage naming files by SHA-256 of their content.
+
+    File is stored as <upload_to>/ab/cd/<hash>.<ext>, where ab and cd
+    are the first bytes of the hash, so no directory grows too large.
+    Identical uploads share one stored file. Saving existing content
+    only refreshes its modification time, so collect_images keeps it.
+
+    Content is written to a temporary file and linked under its name,
+    so concurrent saves of the same content store it once
+    and never see a partially written file.
+
+    Stored files never change, which lets them be cached forever.
+    Files derived from stored ones, like image variants,
+    are saved under names derived from the original name.
+
+    Files are not removed with recipes, as other recipes may share them.
+    collect_images command removes unreferenced files and has to be
+    run periodically, e.g. daily by cron.
+    """
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        path = self.path(name)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            temporary = self.write_temporary(path, content)
+            try:
+                os.link(temporary, path)
+            except FileExistsError:
+                os.utime(path)
+            finally:
+                os.remove(temporary)
+        return name
+
+    def hashed_name(self, name, content):
+        """
+        Method for getting content-addressed name of a file.
+        """
+        sha256 = hashlib.sha256()
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            sha256.update(chunk)
+        content.seek(0)
+        digest = sha256.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(
+            posixpath.dirname(name),
+            digest[:2],
+            digest[2:4],
+            digest + extension,
+        )
+
+    def save_derived(self, name, content):
+        """
+        Method for saving a file derived from stored one under given name.
+        """
+        path = self.path(name)
+        os.replace(self.write_temporary(path, content), path)
+        return name
+
+    def write_temporary(self, path, content):
+        """
+        Method for writing content to a temporary file next to path.
+        """
+        directory = os.path.dirname(path)
+        if self.directory_permissions_mode is None:
+            os.makedirs(directory, exist_ok=True)
+        else:
+            os.makedirs(
+                directory, self.directory_permissions_mode, exist_ok=True
+            )
+        temporary = f"{path}.{secrets.token_hex(8)}.tmp"
+        fd = os.open(temporary, self.OS_OPEN_FLAGS, 0o666)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks(HASH_CHUNK_SIZE):
+                    file.write(
+                        chunk.encode() if isinstance(chunk, str) else chunk
+                    )
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+        except BaseException:
+            os.remove(temporary)
+            raise
+        return temporary
+
+    @staticmethod
+    def is_hashed(name):
+        """
+        Method for checking if name is in content-addressed layout.
+        """
+        return bool(HASHED_NAME.search(name))
@@ -0,0 +1,70 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+# Variant names and sizes of the longest side, largest first.
+VARIANTS = (("full", 1280), ("card", 480), ("thumbnail", 160))
+# Part of variant names, increased when variants are rendered differently
+# so that cached copies of old renditions are never reused.
+VARIANTS_VERSION = 1
+
+if features.check("webp"):
+    VARIANT_FORMAT = "WEBP"
+    VARIANT_EXTENSION = "webp"
+    VARIANT_OPTIONS = {"quality": 80, "method": 4}
+else:
+    VARIANT_FORMAT = "JPEG"
+    VARIANT_EXTENSION = "jpg"
+    VARIANT_OPTIONS = {"quality": 82, "optimize": True, "progressive": True}
+
+
+def variant_name(name, variant):
+    """
+    Get name of a variant of stored image.
+    """
+    root = posixpath.splitext(name)[0]
+    return f"{root}.{variant}.v{VARIANTS_VERSION}.{VARIANT_EXTENSION}"
+
+
+def variant_names(name):
+    """
+    Get names of all variants of stored image by variant.
+    """
+    return {variant: variant_name(name, variant) for variant, _ in VARIANTS}
+
+
+def generate_variants(storage, name):
+    """
+    Generate missing variants of stored image, get number of created ones.
+
+    Image is decoded once, JPEG at reduced scale when possible,
+    and downscaled from the largest variant to the smallest.
+    Images smaller than a variant are recompressed without upscaling.
+    """
+    missing = [
+        (variant, size)
+        for variant, size in VARIANTS
+        if not storage.exists(variant_name(name, variant))
+    ]
+    if not missing:
+        return 0
+    largest = missing[0][1]
+    with storage.open(name) as file, Image.open(file) as original:
+        original.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        has_alpha = image.mode in ("RGBA", "LA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        image = image.convert(
+            "RGBA" if has_alpha and VARIANT_FORMAT == "WEBP" else "RGB"
+        )
+    for variant, size in missing:
+        image.thumbnail((size, size), Image.LANCZOS)
+        buffer = BytesIO()
+        image.save(buffer, VARIANT_FORMAT, **VARIANT_OPTIONS)
+        storage.save_derived(
+            variant_name(name, variant), ContentFile(buffer.getvalue())
+        )
+    return len(missing)
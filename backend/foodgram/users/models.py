@@ -4,7 +4,9 @@ from django.db.models import (
     CharField,
     EmailField,
     ForeignKey,
+    Index,
     Model,
+    PositiveIntegerField,
     TextField,
     UniqueConstraint,
 )
@@ -15,6 +17,7 @@ class User(AbstractUser):
     User model based on abstract user class.
 
     All fields are required. Username and email are unique.
+    Recipes counter is maintained by signals.
     """
 
     email = EmailField(
@@ -30,6 +33,9 @@ class User(AbstractUser):
     first_name = TextField("first_name", max_length=200)
     last_name = TextField("last_name", max_length=200)
     password = TextField("password", max_length=200)
+    recipes_count = PositiveIntegerField(
+        "recipes_count", default=0, editable=False
+    )
 
     def __str__(self):
         return self.username
@@ -49,6 +55,7 @@ class Subscription(Model):
         on_delete=CASCADE,
         related_name="subscriber",
         verbose_name="Subscriber",
+        db_index=False,
         help_text="Subscribed on recipe author",
     )
     author = ForeignKey(
@@ -57,6 +64,7 @@ class Subscription(Model):
         on_delete=CASCADE,
         related_name="author",
         verbose_name="Author",
+        db_index=False,
         help_text="Recipe author",
     )
 
@@ -66,3 +74,6 @@ class Subscription(Model):
                 fields=["author", "user"], name="unique_subscription"
             )
         ]
+        indexes = [
+            Index(fields=["user", "author"], name="subscription_user_idx"),
+        ]